@@ -0,0 +1,1582 @@
+import json
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import maya.cmds as mc
+
+import aim_chain_undo
+import aim_solver
+
+
+AXIS_VECTORS = {
+    "x": (1, 0, 0),
+    "-x": (-1, 0, 0),
+    "y": (0, 1, 0),
+    "-y": (0, -1, 0),
+    "z": (0, 0, 1),
+    "-z": (0, 0, -1),
+}
+
+
+def up_vector_for_axis(axis):
+    # Up vector can't be parallel to the aim vector
+    if axis in ("z", "-z"):
+        return (0, 1, 0)
+    return (0, 0, 1)
+
+
+# How many performance_scope blocks are open, only the outermost one suspends and restores
+_scope_depth = [0]
+
+
+@contextmanager
+def performance_scope(evaluation_mode=None):
+    """
+    Suspend viewport refresh and autosave, and optionally switch the
+    evaluation manager mode ("off", "serial", "parallel"). Everything is
+    restored on exit, errors included
+    """
+    if _scope_depth[0]:
+        _scope_depth[0] += 1
+        try:
+            yield
+        finally:
+            _scope_depth[0] -= 1
+        return
+
+    autosave = mc.autoSave(q=1, enable=1)
+    old_mode = mc.evaluationManager(q=1, mode=1)[0]
+
+    _scope_depth[0] += 1
+    mc.refresh(suspend=True)
+    try:
+        if autosave:
+            mc.autoSave(enable=False)
+        if evaluation_mode and evaluation_mode != old_mode:
+            mc.evaluationManager(mode=evaluation_mode)
+
+        yield
+
+    finally:
+        if evaluation_mode and evaluation_mode != old_mode:
+            mc.evaluationManager(mode=old_mode)
+        if autosave:
+            mc.autoSave(enable=True)
+
+        mc.refresh(suspend=False)
+        _scope_depth[0] -= 1
+
+
+@contextmanager
+def undo_chunk(name):
+    # Everything inside is a single entry in the undo queue
+    mc.undoInfo(openChunk=True, chunkName=name)
+    try:
+        yield
+    finally:
+        mc.undoInfo(closeChunk=True)
+
+
+@contextmanager
+def undo_suspended(suspend=True):
+    # Stop recording undo without flushing the queue
+    if not suspend or not mc.undoInfo(q=1, state=1):
+        yield
+        return
+
+    mc.undoInfo(stateWithoutFlush=False)
+    try:
+        yield
+    finally:
+        mc.undoInfo(stateWithoutFlush=True)
+
+
+def single_undo(method):
+    # Run a builder method as one undo chunk
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with undo_chunk("aimChain_" + method.__name__):
+            self.resolve_nodes()
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def heavy_stage(method):
+    # Run a builder method as one undo chunk, inside performance_scope
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with undo_chunk("aimChain_" + method.__name__), performance_scope(self.config.evaluation_mode):
+            self.resolve_nodes()
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def playback_range():
+    minTime = mc.playbackOptions(q=1, minTime=1)
+    maxTime = mc.playbackOptions(q=1, maxTime=1)
+
+    return minTime, maxTime
+
+
+def keyed_range(nodes):
+    # First and last key over all nodes, in one query. None if nothing is keyed
+    times = mc.keyframe(nodes, q=1, timeChange=1)
+    if not times:
+        return None
+
+    return min(times), max(times)
+
+
+def resolve_bake_range(nodes, bake_range="timeline"):
+    """
+    bake_range is "timeline" for the playback range, "keys" for the keyed
+    range of nodes, or an explicit (start, end)
+    """
+    if bake_range == "timeline":
+        return playback_range()
+
+    if bake_range == "keys":
+        return keyed_range(nodes) or playback_range()
+
+    start, end = bake_range
+    return float(start), float(end)
+
+
+def merge_ranges(ranges):
+    return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+
+def bake(bakee, time_range=None):
+    try:
+        mc.bakeResults(bakee, time=time_range or playback_range(), preserveOutsideKeys=1)
+    except RuntimeError:
+        print("No keys?")
+
+
+def anim_curves(nodes):
+    return mc.listConnections(nodes, source=1, destination=0, type="animCurve") or []
+
+
+def reduce_keys(curves, rotate_tolerance=0.05, translate_tolerance=0.01):
+    # Remove keys the curve can do without, refitting tangents, within the tolerances (degrees / units)
+    angular = mc.ls(curves, type="animCurveTA")
+    if angular:
+        mc.filterCurve(angular, filter="keyReducer", precisionMode=0, precision=rotate_tolerance)
+
+    other = list(set(mc.ls(curves, type="animCurve")) - set(angular))
+    if other:
+        mc.filterCurve(other, filter="keyReducer", precisionMode=0, precision=translate_tolerance)
+
+
+def sample_matrices(nodes, attr, frames):
+    # (frames, nodes, 4, 4) array of a matrix attribute, evaluated without changing the current time
+    sel = om2.MSelectionList()
+    for node in nodes:
+        sel.add("{0}.{1}".format(node, attr))
+    plugs = [sel.getPlug(i) for i in range(sel.length())]
+
+    samples = np.empty((len(frames), len(plugs), 4, 4))
+    for f, frame in enumerate(frames):
+        context = om2.MDGContext(om2.MTime(float(frame), om2.MTime.uiUnit()))
+        for n, plug in enumerate(plugs):
+            matrix = om2.MFnMatrixData(plug.asMObject(context)).matrix()
+            samples[f, n] = np.reshape(list(matrix), (4, 4))
+
+    return samples
+
+
+def shift_curves(shifts):
+    """
+    Move every key of the curves in {curve: frames} by their shift, as one
+    undoable API edit instead of a keyframe command per shift
+    """
+    change = oma2.MAnimCurveChange()
+
+    def do():
+        for curve, shift in shifts.items():
+            fn = oma2.MFnAnimCurve(get_mobject(curve))
+            delta = om2.MTime(shift, om2.MTime.uiUnit())
+            # Last key first when moving later, so no key is moved onto its neighbour
+            indices = range(fn.numKeys)
+            for i in (reversed(indices) if shift > 0 else indices):
+                fn.setTime(i, fn.input(i) + delta, change)
+
+    aim_chain_undo.run_undoable(do, change.undoIt, change.redoIt)
+
+
+def read_curve(curve):
+    # Keys, tangents and infinity of an anim curve
+    return {
+        "type": mc.nodeType(curve),
+        "keys": mc.keyframe(curve, q=1, timeChange=1, valueChange=1),
+        "weighted": mc.keyTangent(curve, q=1, weightedTangents=1)[0],
+        "lock": mc.keyTangent(curve, q=1, lock=1),
+        "in_types": mc.keyTangent(curve, q=1, inTangentType=1),
+        "out_types": mc.keyTangent(curve, q=1, outTangentType=1),
+        "in_angles": mc.keyTangent(curve, q=1, inAngle=1),
+        "out_angles": mc.keyTangent(curve, q=1, outAngle=1),
+        "in_weights": mc.keyTangent(curve, q=1, inWeight=1),
+        "out_weights": mc.keyTangent(curve, q=1, outWeight=1),
+        "infinity": (mc.getAttr(curve + ".preInfinity"), mc.getAttr(curve + ".postInfinity")),
+    }
+
+
+def write_tangents(curve, data, indices):
+    # Tangents from read_curve data, as (index in data, index on curve) pairs
+    for old, new in indices:
+        mc.keyTangent(curve, e=1, index=(new, new), lock=False)
+        if data["in_types"][old] == "fixed" or data["out_types"][old] == "fixed":
+            mc.keyTangent(curve, e=1, index=(new, new),
+                          inAngle=data["in_angles"][old], outAngle=data["out_angles"][old],
+                          inWeight=data["in_weights"][old], outWeight=data["out_weights"][old])
+        mc.keyTangent(curve, e=1, index=(new, new),
+                      inTangentType=data["in_types"][old], outTangentType=data["out_types"][old],
+                      lock=data["lock"][old])
+
+
+def set_curve_keys(plug, frames, values):
+    # Replace the keys of plug inside frames with values, in one setAttr on the curve that animates it.
+    # Curves behind pairBlends and anim layers are written in place, keys outside frames keep their tangents
+    start, end = frames[0], frames[-1]
+    new_keys = [(float(frame), float(value), None) for frame, value in zip(frames, values)]
+
+    curves = mc.keyframe(plug, q=1, name=1)
+    if not curves:
+        if mc.listConnections(plug, source=1, destination=0):
+            raise RuntimeError("{0} is driven by something other than an anim curve".format(plug))
+
+        curve = mc.createNode("animCurveTA", name=plug.split("|")[-1].replace(".", "_"), skipSelect=True)
+        flat = [x for key in new_keys for x in key[:2]]
+        mc.setAttr("{0}.ktv[0:{1}]".format(curve, len(new_keys) - 1), *flat)
+        mc.connectAttr(curve + ".output", plug)
+        return curve
+
+    curve = curves[0]
+    data = read_curve(curve)
+    old_keys = data["keys"]
+    old_count = len(old_keys) // 2
+
+    # (time, value, index of the kept key in data)
+    keys = [(time, value, i) for i, (time, value) in enumerate(zip(old_keys[0::2], old_keys[1::2]))
+            if time < start or time > end]
+    keys.extend(new_keys)
+    keys.sort(key=lambda key: key[0])
+    count = len(keys)
+
+    if old_count > count:
+        mc.cutKey(curve, index=(count, old_count - 1), clear=1)
+    flat = [x for key in keys for x in key[:2]]
+    mc.setAttr("{0}.ktv[0:{1}]".format(curve, count - 1), *flat)
+
+    # Tangents stay with the key index, so the kept keys get theirs back
+    # and the baked ones, which are contiguous, take the default
+    first = len([key for key in keys if key[0] < start])
+    mc.keyTangent(curve, e=1, index=(first, first + len(new_keys) - 1), lock=False,
+                  inTangentType=mc.keyTangent(q=1, g=1, inTangentType=1)[0],
+                  outTangentType=mc.keyTangent(q=1, g=1, outTangentType=1)[0])
+    write_tangents(curve, data, [(key[2], i) for i, key in enumerate(keys) if key[2] is not None])
+
+    return curve
+
+
+def make_group(name, parent=None):
+    # Empty transform, like group -empty but leaving the selection alone
+    if parent:
+        return mc.createNode("transform", name=name, parent=parent, skipSelect=True)
+    return mc.createNode("transform", name=name, skipSelect=True)
+
+
+def make_locator(name, parent=None):
+    transform = make_group(name, parent)
+    mc.createNode("locator", name=name + "Shape", parent=transform, skipSelect=True)
+    return transform
+
+
+def make_sphere(name, radius, parent=None):
+    # NURBS sphere without history, like sphere -ch 0 but leaving the selection alone
+    transform = make_group(name, parent)
+    shape = mc.createNode("nurbsSurface", name=name + "Shape", parent=transform, skipSelect=True)
+
+    maker = mc.createNode("makeNurbSphere", skipSelect=True)
+    mc.setAttr(maker + ".radius", radius)
+    mc.connectAttr(maker + ".outputSurface", shape + ".create")
+    mc.delete(shape, constructionHistory=True)
+
+    mc.sets(shape, edit=1, forceElement="initialShadingGroup")
+    return transform
+
+
+def get_mobject(name):
+    sel = om2.MSelectionList()
+    sel.add(name)
+    return sel.getDependNode(0)
+
+
+def node_path(obj):
+    # Shortest unique name, same as what cmds returns
+    return om2.MFnDagNode(obj).partialPathName()
+
+
+def short_name(node):
+    # Name without the DAG path, for deriving new node names from
+    return node.split("|")[-1]
+
+
+class NodeTable(object):
+    """
+    Nodes kept by UUID with their MObjectHandle and, for DAG nodes, a cached
+    MDagPath. Names are read back from the handles, so they follow renames
+    and never need the scene searched by name
+    """
+
+    def __init__(self):
+        # {uuid: [MObjectHandle, MDagPath or None]}
+        self.entries = {}
+
+    def add(self, node):
+        # Returns the node's UUID, None if it doesn't exist
+        if not node or not mc.objExists(node):
+            return None
+
+        obj = get_mobject(node)
+        key = om2.MFnDependencyNode(obj).uuid().asString()
+        path = om2.MDagPath.getAPathTo(obj) if obj.hasFn(om2.MFn.kDagNode) else None
+        self.entries[key] = [om2.MObjectHandle(obj), path]
+
+        return key
+
+    def name(self, key):
+        # Current shortest unique name, None once the node is gone
+        entry = self.entries.get(key)
+        if entry is None or not entry[0].isValid():
+            # Not looked up yet, or deleted and brought back by undo
+            node = uuid_node(key, long=False)
+            if not node or not self.add(node):
+                return None
+            entry = self.entries[key]
+
+        handle, path = entry
+        if path is None:
+            return om2.MFnDependencyNode(handle.object()).name()
+        if not path.isValid():
+            path = entry[1] = om2.MDagPath.getAPathTo(handle.object())
+
+        return path.partialPathName()
+
+
+def renamed_overrides(overrides, renamed):
+    # {ctrl: axis} with the renamed controls' new names
+    return dict((renamed.get(ctrl, ctrl), axis) for ctrl, axis in overrides.items())
+
+
+def create_transform(mod, parent, name):
+    obj = mod.createNode("transform", parent)
+    mod.renameNode(obj, name)
+    return obj
+
+
+def create_locator(mod, parent, name):
+    obj = create_transform(mod, parent, name)
+    shape = mod.createNode("locator", obj)
+    mod.renameNode(shape, name + "Shape")
+    return obj
+
+
+def create_parent_constraint(mod, driver, driven, name):
+    # Wire a parentConstraint by hand, like parentConstraint -mo 0 would
+    driver_fn = om2.MFnDependencyNode(driver)
+    driven_fn = om2.MFnDependencyNode(driven)
+
+    con = mod.createNode("parentConstraint", driven)
+    con_fn = om2.MFnDependencyNode(con)
+    mod.renameNode(con, name)
+
+    def target_plug(attr):
+        plug = om2.MPlug(con, con_fn.attribute(attr))
+        plug.selectAncestorLogicalIndex(0, con_fn.attribute("target"))
+        return plug
+
+    inputs = [
+        ("translate", "targetTranslate"),
+        ("rotate", "targetRotate"),
+        ("rotateOrder", "targetRotateOrder"),
+        ("rotatePivot", "targetRotatePivot"),
+        ("rotatePivotTranslate", "targetRotateTranslate"),
+        ("scale", "targetScale"),
+    ]
+    if driver.hasFn(om2.MFn.kJoint):
+        inputs.append(("jointOrient", "targetJointOrient"))
+
+    for src, dst in inputs:
+        mod.connect(driver_fn.findPlug(src, False), target_plug(dst))
+    mod.connect(driver_fn.findPlug("parentMatrix", False).elementByLogicalIndex(0), target_plug("targetParentMatrix"))
+    mod.newPlugValueDouble(target_plug("targetWeight"), 1.0)
+
+    mod.connect(driven_fn.findPlug("parentInverseMatrix", False).elementByLogicalIndex(0),
+                con_fn.findPlug("constraintParentInverseMatrix", False))
+    for src, dst in [("rotateOrder", "constraintRotateOrder"),
+                     ("rotatePivot", "constraintRotatePivot"),
+                     ("rotatePivotTranslate", "constraintRotateTranslate")]:
+        mod.connect(driven_fn.findPlug(src, False), con_fn.findPlug(dst, False))
+
+    mod.connect(con_fn.findPlug("constraintTranslate", False), driven_fn.findPlug("translate", False))
+    mod.connect(con_fn.findPlug("constraintRotate", False), driven_fn.findPlug("rotate", False))
+
+    return con
+
+
+def chain_parents(chain_ctrls):
+    # Index of the closest chain control above each control, -1 for none
+    paths = [mc.ls(ctrl, long=1)[0] for ctrl in chain_ctrls]
+    index = dict((path, i) for i, path in enumerate(paths))
+
+    parents = []
+    for path in paths:
+        parent = -1
+        ancestors = path.split("|")
+        while len(ancestors) > 1:
+            ancestors.pop()
+            if "|".join(ancestors) in index:
+                parent = index["|".join(ancestors)]
+                break
+        parents.append(parent)
+
+    return parents
+
+
+class CurveSnapshot(object):
+    """
+    Compact copy of the animation on some plugs (keys and tangents, or the
+    static value), used to restore what a bake changed while undo was off
+    """
+
+    def __init__(self, plugs):
+        # (plug, curve that animated it, curve data)
+        self.curves = []
+        self.statics = {}
+        # Anim layers made by the bake, deleted on restore
+        self.layers = []
+
+        for plug in plugs:
+            # Also finds curves behind pairBlends and anim layers
+            curves = mc.keyframe(plug, q=1, name=1)
+            if curves:
+                self.curves.append((plug, curves[0], read_curve(curves[0])))
+            elif not mc.listConnections(plug, source=1, destination=0):
+                self.statics[plug] = mc.getAttr(plug)
+
+    @staticmethod
+    def clear(plug):
+        curves = mc.listConnections(plug, source=1, destination=0, type="animCurve") or []
+        if curves:
+            mc.delete(curves)
+
+    @staticmethod
+    def write_curve(curve, data):
+        # Put the saved keys back into curve, in place so its connections stay as they are
+        keys = data["keys"]
+        count = len(keys) // 2
+
+        old_count = mc.keyframe(curve, q=1, keyframeCount=1) or 0
+        if old_count > count:
+            mc.cutKey(curve, index=(count, old_count - 1), clear=1)
+        mc.setAttr("{0}.ktv[0:{1}]".format(curve, count - 1), *keys)
+        mc.setAttr(curve + ".preInfinity", data["infinity"][0])
+        mc.setAttr(curve + ".postInfinity", data["infinity"][1])
+        mc.keyTangent(curve, e=1, weightedTangents=data["weighted"])
+        write_tangents(curve, data, [(i, i) for i in range(count)])
+
+    def restore(self):
+        # Layers go first, deleting one hands its plugs back to the base curves
+        layers = [layer for layer in self.layers if mc.animLayer(layer, q=1, exists=1)]
+        if layers:
+            mc.delete(layers)
+        self.layers = []
+
+        for plug, curve, data in self.curves:
+            current = mc.keyframe(plug, q=1, name=1)
+            if mc.objExists(curve):
+                # Curves the bake left alone keep their keys as they are
+                if read_curve(curve) != data:
+                    self.write_curve(curve, data)
+            elif current:
+                # The bake swapped the curve out, its replacement takes the saved keys
+                self.write_curve(current[0], data)
+            elif not mc.listConnections(plug, source=1, destination=0):
+                curve = mc.createNode(data["type"], name=plug.split("|")[-1].replace(".", "_"), skipSelect=True)
+                self.write_curve(curve, data)
+                mc.connectAttr(curve + ".output", plug)
+
+        for plug, value in self.statics.items():
+            self.clear(plug)
+            mc.setAttr(plug, value)
+
+
+class ChainSpec(object):
+    """
+    Per-control settings, built once per build and shared by every stage
+    """
+
+    __slots__ = ("index", "ctrl", "axis", "aim_vector", "up_vector", "distance", "offset_vector", "skip")
+
+    def __init__(self, index, ctrl, axis, distance, skip=()):
+        self.index = index
+        self.ctrl = ctrl
+        self.axis = axis
+        self.aim_vector = AXIS_VECTORS[axis]
+        self.up_vector = up_vector_for_axis(axis)
+        # Rotate axes locked on the control, skipped by the orient constraint
+        self.skip = list(skip)
+
+        self.set_distance(distance)
+
+    def set_distance(self, distance):
+        self.distance = float(distance)
+        self.offset_vector = [x * self.distance for x in self.aim_vector]
+
+
+class AimChainConfig(object):
+    """
+    Settings for one aim chain, independent of any UI
+    """
+
+    def __init__(self, chain_ctrls, space=None, axis="z", overrides=None, distance=2.5,
+                 offset=1.0, exponent=0.0, include_first=False, spheres=False, modifier_build=False,
+                 bake_range="timeline", reduce_keys=False, rotate_tolerance=0.05, translate_tolerance=0.01,
+                 evaluation_mode=None, fast_undo=False, offset_mode="keys", offset_profile="linear",
+                 offset_table=None, bake_layer=True):
+        self.chain_ctrls = list(chain_ctrls)
+        # None (or empty) means world space
+        self.space = space or None
+        self.axis = axis
+        # {ctrl: axis} for the controls that don't use the main axis
+        self.overrides = dict(overrides or {})
+        self.distance = float(distance)
+
+        self.offset = float(offset)
+        self.exponent = float(exponent)
+        self.include_first = include_first
+        # "keys" moves the target keys, "timewarp" feeds their curves a shifted time instead
+        self.offset_mode = offset_mode
+        # Cascade shape, see aim_solver.offset_profile. offset_table is used by the "table" profile
+        self.offset_profile = offset_profile
+        self.offset_table = list(offset_table) if offset_table else None
+
+        self.spheres = spheres
+        # Create the rig network with one OpenMaya modifier instead of cmds calls
+        self.modifier_build = modifier_build
+        # "timeline", "keys" or (start, end), see resolve_bake_range
+        self.bake_range = bake_range
+
+        # Key reduction after every bake
+        self.reduce_keys = reduce_keys
+        self.rotate_tolerance = float(rotate_tolerance)
+        self.translate_tolerance = float(translate_tolerance)
+
+        # Bake the controls onto an override layer, or straight onto their base curves
+        self.bake_layer = bake_layer
+
+        # Evaluation manager mode for build and bake, None leaves the artist's mode alone
+        self.evaluation_mode = evaluation_mode
+        # Bake onto the controls with undo off, keeping a CurveSnapshot to restore instead
+        self.fast_undo = fast_undo
+
+        if not self.chain_ctrls:
+            raise ValueError("Aim chain needs at least one control")
+
+        if self.bake_range not in ("timeline", "keys"):
+            try:
+                valid = len([float(x) for x in self.bake_range]) == 2
+            except (TypeError, ValueError):
+                valid = False
+            if not valid:
+                raise ValueError("Unknown bake range: {0}".format(self.bake_range))
+
+        for ctrl_axis in [self.axis] + list(self.overrides.values()):
+            if ctrl_axis not in AXIS_VECTORS:
+                raise ValueError("Unknown axis: {0}".format(ctrl_axis))
+
+        if self.offset_mode not in ("keys", "timewarp"):
+            raise ValueError("Unknown offset mode: {0}".format(self.offset_mode))
+
+        if self.offset_profile not in aim_solver.OFFSET_PROFILES:
+            raise ValueError("Unknown offset profile: {0}".format(self.offset_profile))
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def ctrl_axis(self, ctrl):
+        return self.overrides.get(ctrl, self.axis)
+
+
+class AimChainBuilder(object):
+    """
+    Builds, offsets and bakes an aim rig from an AimChainConfig
+    """
+
+    def __init__(self, config):
+        self.config = config
+        # Key of this rig in the AimRigRegistry, set on build
+        self.rig_id = None
+
+        # Preview locators and the multiplyDivides that place them, by control, and their shared distance node
+        self.preview_locs = {}
+        self.preview_multipliers = {}
+        self.preview_node = None
+
+        self.rooter_grp = None
+        self.hooked_up_grp = None
+        self.sphere_grp = None
+
+        self.offsetLocList = []
+        self.rootLocList = []
+        self.targetLocList = []
+        # Children of the target locators, offset along the aim axis
+        self.tipLocList = []
+        self.aim_constraints = []
+        self.ctrl_constraints = []
+        # Locked axes each control was constrained with, kept in the registry
+        self.ctrl_skips = []
+        # Anim curves of each target locator, cached for offsetting
+        self.target_curve_list = None
+
+        # Controls and rig nodes by handle, {attribute: uuid or [uuids]}, see resolve_nodes
+        self.node_table = NodeTable()
+        self.node_keys = {}
+
+        # CurveSnapshot of the controls from the last fast_undo bake
+        self.snapshot = None
+
+        # ChainSpec per control, and the same records by control name
+        self.specs = []
+        self.spec_index = {}
+
+    @property
+    def aim_rig(self):
+        return bool(self.rooter_grp)
+
+    @property
+    def temp_loc_list(self):
+        return [self.preview_locs[ctrl] for ctrl in self.config.chain_ctrls if ctrl in self.preview_locs]
+
+    def track_nodes(self):
+        # Remember the controls and every rig node by handle
+        table = self.node_table
+        self.node_keys = {"chain_ctrls": [table.add(ctrl) for ctrl in self.config.chain_ctrls]}
+
+        for attr in AimRigRegistry.NODE_ATTRS:
+            self.node_keys[attr] = table.add(getattr(self, attr))
+        for attr in AimRigRegistry.NODE_LIST_ATTRS:
+            self.node_keys[attr] = [table.add(node) for node in getattr(self, attr)]
+
+        return self.node_keys
+
+    def resolve_nodes(self):
+        # Refresh node names from their handles, nodes that are gone keep their old name
+        if not self.node_keys:
+            return
+
+        name = self.node_table.name
+        for attr in AimRigRegistry.NODE_ATTRS:
+            if self.node_keys.get(attr):
+                setattr(self, attr, name(self.node_keys[attr]) or getattr(self, attr))
+
+        for attr in AimRigRegistry.NODE_LIST_ATTRS + ["chain_ctrls"]:
+            owner = self.config if attr == "chain_ctrls" else self
+            keys, nodes = self.node_keys.get(attr, []), getattr(owner, attr)
+            # Lists changed since they were tracked are left alone
+            if len(keys) != len(nodes):
+                continue
+
+            resolved = [(key and name(key)) or node for key, node in zip(keys, nodes)]
+            if attr == "chain_ctrls" and resolved != nodes:
+                renamed = dict((old, new) for old, new in zip(nodes, resolved) if old != new)
+                self.config.overrides = renamed_overrides(self.config.overrides, renamed)
+                self.specs = []
+            setattr(owner, attr, resolved)
+
+    def make_specs(self):
+        self.specs = []
+        for index, ctrl in enumerate(self.config.chain_ctrls):
+            self.specs.append(ChainSpec(index, ctrl, self.config.ctrl_axis(ctrl), self.config.distance,
+                                        self.axis_to_skip_if_locked(ctrl)))
+
+        self.spec_index = dict((spec.ctrl, spec) for spec in self.specs)
+        return self.specs
+
+    def chain_specs(self):
+        if len(self.specs) != len(self.config.chain_ctrls):
+            self.make_specs()
+        return self.specs
+
+    # Slider temp locators
+    @single_undo
+    def make_locators(self):
+        # Locators are pooled: controls still in the chain keep theirs, only the difference is created or deleted
+        specs = self.make_specs()
+        self.prune_preview()
+        self.delete_preview([ctrl for ctrl in self.preview_locs if ctrl not in self.spec_index])
+
+        # One distance attribute drives every temp locator, so the slider is a single setAttr
+        if not self.preview_node:
+            self.preview_node = mc.createNode("network", name="aim_preview_distance", skipSelect=True)
+            mc.addAttr(self.preview_node, longName="distance", attributeType="double")
+        mc.setAttr(self.preview_node + ".distance", self.config.distance)
+
+        for spec in specs:
+            if spec.ctrl in self.preview_locs:
+                # The axis may have changed
+                mc.setAttr(self.preview_multipliers[spec.ctrl] + ".input2", *spec.aim_vector)
+                continue
+
+            # Made under the ctrl, so it sits on it
+            temp_loc = make_locator(short_name(spec.ctrl) + "temp_aim_target", spec.ctrl)
+
+            # distance * axis
+            multiply = mc.createNode("multiplyDivide", name=short_name(spec.ctrl) + "temp_aim_mult", skipSelect=True)
+            mc.setAttr(multiply + ".input2", *spec.aim_vector)
+            for axis in "XYZ":
+                mc.connectAttr(self.preview_node + ".distance", multiply + ".input1" + axis)
+            mc.connectAttr(multiply + ".output", temp_loc + ".translate")
+
+            self.preview_locs[spec.ctrl] = temp_loc
+            self.preview_multipliers[spec.ctrl] = multiply
+
+        return self.temp_loc_list
+
+    def update_locators(self, distance):
+        self.config.distance = float(distance)
+
+        if self.preview_node and mc.objExists(self.preview_node):
+            mc.setAttr(self.preview_node + ".distance", self.config.distance)
+
+    def prune_preview(self):
+        # Forget preview nodes deleted from the scene, the pool is rebuilt if the distance node went
+        if self.preview_node and not mc.objExists(self.preview_node):
+            self.delete_locators()
+            return
+
+        broken = [ctrl for ctrl in self.preview_locs
+                  if not (mc.objExists(self.preview_locs[ctrl]) and mc.objExists(self.preview_multipliers[ctrl]))]
+        self.delete_preview(broken)
+
+    def delete_preview(self, ctrls):
+        nodes = []
+        for ctrl in ctrls:
+            nodes.append(self.preview_locs.pop(ctrl))
+            nodes.append(self.preview_multipliers.pop(ctrl))
+
+        existing = [node for node in nodes if mc.objExists(node)]
+        if existing:
+            mc.delete(existing)
+
+    def take_preview(self):
+        # Hand the preview locators of the chain over to the build, {ctrl: locator}, and delete the rest.
+        # Without their multiplyDivide the locators keep the last previewed translate
+        self.prune_preview()
+        self.delete_preview([ctrl for ctrl in self.preview_locs if ctrl not in self.spec_index])
+
+        pool = self.preview_locs
+        self.preview_locs = {}
+        self.delete_locators()
+
+        return pool
+
+    def delete_locators(self):
+        preview = list(self.preview_locs.values()) + list(self.preview_multipliers.values())
+        if self.preview_node:
+            preview.append(self.preview_node)
+
+        existing = [node for node in preview if mc.objExists(node)]
+        if existing:
+            mc.delete(existing)
+
+        self.preview_locs = {}
+        self.preview_multipliers = {}
+        self.preview_node = None
+
+##################################################################################
+############################# Building Rig Stuff #################################
+##################################################################################
+
+    def check_if_rig_exists(self):
+        # A control can only be driven by one rig, delete the rigs already on this chain
+        registry = AimRigRegistry()
+        for rig_id in registry.rigs_for_ctrls(self.config.chain_ctrls):
+            if rig_id != self.rig_id:
+                registry.builder(rig_id).delete()
+
+    @heavy_stage
+    def build(self):
+        bakees, tempConstraints = self.prepare()
+        bake(bakees, self.bake_time_range())
+        self.finish(tempConstraints)
+
+        return self.rooter_grp
+
+    def bake_time_range(self):
+        nodes = list(self.config.chain_ctrls)
+        if self.config.space:
+            nodes.append(self.config.space)
+
+        return resolve_bake_range(nodes, self.config.bake_range)
+
+    def cascade_time_range(self):
+        # Baking off a built rig, offset targets run past the chain's keys.
+        # Their keys carry the keyed shifts, time warps add theirs on top
+        start, end = self.bake_time_range()
+        target_range = keyed_range(self.targetLocList) if self.targetLocList else None
+        if self.config.bake_range != "keys" or not target_range:
+            return start, end
+
+        warp_shifts = self.warp_shifts()
+        return (min(start, target_range[0] + min(warp_shifts + [0.0])),
+                max(end, target_range[1] + max(warp_shifts + [0.0])))
+
+    def prepare(self):
+        # Everything up to the bake, returns what needs baking and the constraints to delete after
+        self.check_if_rig_exists()
+        self.rig_id = uuid.uuid4().hex[:8]
+
+        self.offsetLocList = []
+        self.rootLocList = []
+        self.targetLocList = []
+        self.tipLocList = []
+        self.aim_constraints = []
+        self.ctrl_constraints = []
+        self.ctrl_skips = []
+
+        self.make_specs()
+
+        # Guide locators become the target locators
+        pool = self.take_preview()
+
+        spaceCon = self.set_space()
+
+        if self.config.modifier_build:
+            bakees, tempConstraints = self.make_network_modifier(pool)
+        else:
+            bakees, tempConstraints = self.make_network(pool)
+
+        # The space group is baked in the same pass as the locators under it
+        if spaceCon:
+            bakees.insert(0, self.rooter_grp)
+            tempConstraints.append(spaceCon)
+
+        return bakees, tempConstraints
+
+    def finish(self, tempConstraints):
+        # Deleting, now baked, space, Root and Target locator's constraints
+        mc.delete(tempConstraints)
+
+        self.reduce_curves(anim_curves([self.rooter_grp] + self.rootLocList + self.targetLocList))
+        self.target_curve_list = None
+        self.target_curves()
+
+        self.make_aim_constraints()
+
+        if self.config.spheres:
+            self.make_spheres()
+
+        AimRigRegistry().register(self)
+
+    # Settings that only move the tips, and the ones the built locators depend on.
+    # Offset and bake-only settings change neither
+    TIP_SETTINGS = ("axis", "overrides", "distance", "spheres")
+    BUILD_SETTINGS = ("chain_ctrls", "space", "bake_range", "reduce_keys", "rotate_tolerance", "translate_tolerance",
+                      "modifier_build")
+
+    def needs_rebuild(self, config):
+        def settings(cfg):
+            # Through JSON, so a config loaded from the registry compares equal
+            data = json.loads(json.dumps(cfg.to_dict()))
+            return dict((key, data.get(key)) for key in self.BUILD_SETTINGS)
+
+        return settings(config) != settings(self.config)
+
+    @single_undo
+    def update(self, config):
+        """
+        Apply config to the built rig in place when only the distance, axes or
+        spheres changed. Returns False when it needs a full build instead,
+        e.g. for a new bake range so upstream animation is picked up again
+        """
+        if not self.aim_rig or len(self.tipLocList) != len(self.config.chain_ctrls):
+            return False
+        if self.needs_rebuild(config):
+            return False
+        # Build with nothing changed rebuilds, that is how new upstream animation is picked up
+        if all(getattr(config, key) == getattr(self.config, key) for key in self.TIP_SETTINGS):
+            return False
+
+        old_specs = self.chain_specs()
+        for key in self.TIP_SETTINGS:
+            setattr(self.config, key, getattr(config, key))
+
+        # Spheres hold the tips, they are cheap and remade at the new radius
+        self.delete_spheres()
+
+        specs = self.make_specs()
+        relocked = []
+        for old, spec in zip(old_specs, specs):
+            mc.setAttr(self.tipLocList[spec.index] + ".translate", *spec.offset_vector)
+            # Against the locks the rig was built with, unknown for rigs from before they were recorded
+            if len(self.ctrl_skips) == len(specs) and self.ctrl_skips[spec.index] != spec.skip:
+                relocked.append(spec.ctrl)
+            if old.aim_vector == spec.aim_vector:
+                continue
+
+            aim_con = self.aim_constraints[spec.index]
+            mc.setAttr(aim_con + ".aimVector", *spec.aim_vector)
+            mc.setAttr(aim_con + ".upVector", *spec.up_vector)
+            mc.setAttr(aim_con + ".worldUpVector", *spec.up_vector)
+            mc.setAttr(aim_con + ".offset", 0, 0, 0)
+
+        if self.config.spheres:
+            self.make_spheres()
+
+        # Controls whose locked axes changed need their constraint remade
+        if relocked:
+            self.rebuild_controls(relocked)
+
+        AimRigRegistry().register(self)
+        return True
+
+    def make_network(self, pool=None):
+        pool = pool or {}
+        bakees = []
+        tempConstraints = []
+
+        self.hooked_up_grp = make_group("hooked_up_Aim_Loc_Grp", self.rooter_grp)
+        mc.setAttr(self.hooked_up_grp + ".visibility", 0)
+
+        for spec in self.specs:
+            obj = spec.ctrl
+            name = short_name(obj)
+
+            # Make the 3 Locators, root and offset under the group (controlled by space input),
+            # reusing the control's preview locator as the target
+            rootLoc = make_locator(name + "aim_root", self.hooked_up_grp)
+            offsetLoc = make_locator(name + "aim_offset", rootLoc)
+            if obj in pool:
+                targetLoc = mc.parent(mc.rename(pool[obj], name + "aim_target"), self.rooter_grp, relative=1)[0]
+            else:
+                targetLoc = make_locator(name + "aim_target", self.rooter_grp)
+
+            # The target follows the control, its tip carries the offset in selected axis,
+            # so distance and axis stay editable without a rebake
+            tipLoc = make_locator(name + "aim_tip", targetLoc)
+            mc.setAttr(tipLoc + ".translate", *spec.offset_vector)
+
+            # Sort target locators into list for later Offsetting
+            self.targetLocList.append(targetLoc)
+            self.tipLocList.append(tipLoc)
+            self.offsetLocList.append(offsetLoc)
+            self.rootLocList.append(rootLoc)
+
+            tempRootCon = mc.parentConstraint(obj, rootLoc, mo=0)
+            tempCon = mc.parentConstraint(obj, targetLoc, mo=0)
+
+            bakees.append(rootLoc)
+            bakees.append(targetLoc)
+
+            tempConstraints.append(tempCon[0])
+            tempConstraints.append(tempRootCon[0])
+
+        return bakees, tempConstraints
+
+    def make_network_modifier(self, pool=None):
+        # Same network as make_network, queued on one DAG modifier and executed once
+        pool = pool or {}
+        mod = om2.MDagModifier()
+
+        rooter_obj = get_mobject(self.rooter_grp)
+        hooked_obj = create_transform(mod, rooter_obj, "hooked_up_Aim_Loc_Grp")
+        mod.newPlugValueBool(om2.MFnDependencyNode(hooked_obj).findPlug("visibility", False), False)
+
+        created = []
+        for spec in self.specs:
+            obj = spec.ctrl
+            name = short_name(obj)
+            ctrl_obj = get_mobject(obj)
+
+            rootLoc = create_locator(mod, hooked_obj, name + "aim_root")
+            offsetLoc = create_locator(mod, rootLoc, name + "aim_offset")
+            if obj in pool:
+                targetLoc = get_mobject(pool[obj])
+                mod.reparentNode(targetLoc, rooter_obj)
+                mod.renameNode(targetLoc, name + "aim_target")
+            else:
+                targetLoc = create_locator(mod, rooter_obj, name + "aim_target")
+
+            tipLoc = create_locator(mod, targetLoc, name + "aim_tip")
+            tip_fn = om2.MFnDependencyNode(tipLoc)
+            for attr, value in zip(("translateX", "translateY", "translateZ"), spec.offset_vector):
+                mod.newPlugValueDouble(tip_fn.findPlug(attr, False), value)
+
+            tempRootCon = create_parent_constraint(mod, ctrl_obj, rootLoc, name + "aim_root_parentConstraint1")
+            tempCon = create_parent_constraint(mod, ctrl_obj, targetLoc, name + "aim_target_parentConstraint1")
+
+            created.append((offsetLoc, rootLoc, targetLoc, tipLoc, tempRootCon, tempCon))
+
+        # Through a plugin command, so the modifier is undone with the rest of the build
+        aim_chain_undo.run_undoable(mod.doIt, mod.undoIt)
+
+        self.hooked_up_grp = node_path(hooked_obj)
+
+        bakees = []
+        tempConstraints = []
+        for offsetLoc, rootLoc, targetLoc, tipLoc, tempRootCon, tempCon in created:
+            self.offsetLocList.append(node_path(offsetLoc))
+            self.rootLocList.append(node_path(rootLoc))
+            self.targetLocList.append(node_path(targetLoc))
+            self.tipLocList.append(node_path(tipLoc))
+
+            bakees.append(self.rootLocList[-1])
+            bakees.append(self.targetLocList[-1])
+
+            tempConstraints.append(node_path(tempRootCon))
+            tempConstraints.append(node_path(tempCon))
+
+        return bakees, tempConstraints
+
+    def reduce_curves(self, curves):
+        if self.config.reduce_keys and curves:
+            reduce_keys(curves, self.config.rotate_tolerance, self.config.translate_tolerance)
+
+    def set_space(self):
+        # Check if world space, returns the space constraint to bake and delete if not
+        self.rooter_grp = make_group("collection_Aim_Loc_Grp")
+        mc.addAttr(self.rooter_grp, longName="aimRigId", dataType="string")
+        mc.setAttr(self.rooter_grp + ".aimRigId", self.rig_id, type="string")
+
+        if self.config.space:
+            return mc.parentConstraint(self.config.space, self.rooter_grp)[0]
+
+    def make_aim_constraints(self):
+        # Setting the pointCon for rootLocs (to lock ctrls in place), and Aim constraints
+        for spec in self.chain_specs():
+            aim_con, ctrl_con = self.constrain_control(spec)
+
+            self.aim_constraints.append(aim_con)
+            self.ctrl_constraints.append(ctrl_con)
+            self.ctrl_skips.append(spec.skip)
+
+    def constrain_control(self, spec):
+        i = spec.index
+        mc.pointConstraint(spec.ctrl, self.rootLocList[i], mo=0)
+
+        aim_con = mc.aimConstraint(self.tipLocList[i], self.offsetLocList[i], mo=1, weight=1,
+                                   aimVector=spec.aim_vector,
+                                   upVector=spec.up_vector, worldUpType="objectrotation",
+                                   worldUpObject=self.rootLocList[i], worldUpVector=spec.up_vector)[0]
+
+        # An unkeyed control gets its own rotation back from the rest rotation when the rig is muted
+        rest = mc.getAttr(spec.ctrl + ".rotate")[0]
+        ctrl_con = mc.orientConstraint(self.offsetLocList[i], spec.ctrl, skip=spec.skip or "none", mo=0)[0]
+        mc.setAttr(ctrl_con + ".restRotate", *rest)
+
+        return aim_con, ctrl_con
+
+    def unconstrain_control(self, spec):
+        i = spec.index
+        ctrl_con = self.ctrl_constraints[i]
+        rest = None
+        if mc.objExists(ctrl_con) and not mc.listConnections(ctrl_con, source=0, type="pairBlend"):
+            rest = mc.getAttr(ctrl_con + ".restRotate")[0]
+
+        nodes = mc.listRelatives(self.rootLocList[i], type="pointConstraint") or []
+        nodes += [con for con in (self.aim_constraints[i], ctrl_con) if mc.objExists(con)]
+        if nodes:
+            mc.delete(nodes)
+
+        # Keyed controls are back on their curves, unkeyed ones keep the constrained value
+        if rest:
+            for axis, value in zip("XYZ", rest):
+                if not mc.getAttr(spec.ctrl + ".rotate" + axis, lock=1):
+                    mc.setAttr(spec.ctrl + ".rotate" + axis, value)
+
+    @contextmanager
+    def constraints_muted(self, constraints):
+        # Let the controls' own rotation through: keyed controls by their pairBlend weight,
+        # unkeyed ones by dropping to the constraint's rest rotation
+        restore = []
+        for con in constraints:
+            if not mc.objExists(con):
+                continue
+
+            blends = set(mc.listConnections(con, source=0, type="pairBlend") or [])
+            if blends:
+                plugs = []
+                for blend in blends:
+                    plugs += mc.listConnections(blend + ".weight", destination=0, plugs=1) or [blend + ".weight"]
+            else:
+                restore.append((con + ".enableRestPosition", mc.getAttr(con + ".enableRestPosition")))
+                mc.setAttr(con + ".enableRestPosition", 1)
+                plugs = [con + "." + alias for alias in mc.orientConstraint(con, q=1, weightAliasList=1)]
+
+            for plug in plugs:
+                restore.append((plug, mc.getAttr(plug)))
+                mc.setAttr(plug, 0)
+
+        try:
+            yield
+        finally:
+            for plug, value in reversed(restore):
+                mc.setAttr(plug, value)
+
+    @heavy_stage
+    def rebuild_controls(self, ctrls):
+        """
+        Rebake the root and target locators of some controls only and constrain
+        them again, e.g. after their animation or locked axes changed.
+        Returns the rebuilt controls
+        """
+        specs = [spec for spec in self.make_specs() if spec.ctrl in ctrls]
+        if not specs or len(self.aim_constraints) != len(self.specs):
+            return []
+
+        rebuilt = set(spec.index for spec in specs)
+        others = [con for i, con in enumerate(self.ctrl_constraints) if i not in rebuilt]
+
+        warp_shifts = self.warp_shifts()
+        self.remove_time_warps(rebuilt)
+
+        # Rebuilt targets go back to their baked timing first, the bake keeps keys outside
+        # its range and shifted keys past the end would be shifted again afterwards
+        applied = self.applied_shifts()
+        self.shift_targets([-applied[i] if i in rebuilt else 0.0 for i in range(len(applied))])
+
+        # The rest of the chain shows its own animation while the locators are baked
+        with self.constraints_muted(others):
+            bakees = []
+            tempConstraints = []
+            for spec in specs:
+                self.unconstrain_control(spec)
+
+                i = spec.index
+                tempConstraints += mc.parentConstraint(spec.ctrl, self.rootLocList[i], mo=0)
+                tempConstraints += mc.parentConstraint(spec.ctrl, self.targetLocList[i], mo=0)
+                bakees += [self.rootLocList[i], self.targetLocList[i]]
+
+            bake(bakees, self.bake_time_range())
+            mc.delete(tempConstraints)
+            self.reduce_curves(anim_curves(bakees))
+            self.target_curve_list = None
+
+            # Rebaked targets get their offset from the ledger, and their time warp, back
+            self.shift_targets([applied[i] if i in rebuilt else 0.0 for i in range(len(applied))])
+            if any(warp_shifts):
+                self.warp_targets(warp_shifts)
+
+        for spec in specs:
+            self.aim_constraints[spec.index], self.ctrl_constraints[spec.index] = self.constrain_control(spec)
+            if len(self.ctrl_skips) == len(self.specs):
+                self.ctrl_skips[spec.index] = spec.skip
+
+        AimRigRegistry().register(self)
+        return [spec.ctrl for spec in specs]
+
+    def make_spheres(self):
+        #create nurbs Spheres
+        self.sphere_grp = make_group("sphere_grp", self.rooter_grp)
+        mc.setAttr(self.sphere_grp + ".visibility", 0)
+        mc.reorder(self.sphere_grp, front=1)
+
+        for spec in self.chain_specs():
+            sphere = make_sphere(short_name(spec.ctrl) + "_sphere", spec.distance, self.sphere_grp)
+            mc.pointConstraint(spec.ctrl, sphere, mo=0)
+            mc.geometryConstraint(sphere, self.tipLocList[spec.index])
+
+    def delete_spheres(self):
+        # The geometryConstraints live under the tips, they go with the spheres
+        nodes = []
+        if self.tipLocList:
+            nodes = mc.listRelatives(self.tipLocList, type="geometryConstraint") or []
+        if self.sphere_grp and mc.objExists(self.sphere_grp):
+            nodes.append(self.sphere_grp)
+
+        if nodes:
+            mc.delete(nodes)
+        self.sphere_grp = None
+
+    @staticmethod
+    def axis_to_skip_if_locked(ctrl):
+        xyz_skip_list = []
+
+        for axis in ['.rotateX', '.rotateY', '.rotateZ']:
+            if mc.getAttr(ctrl + axis, lock=1):
+                xyz_skip_list.append(axis[-1].lower())
+
+        return xyz_skip_list
+
+    @single_undo
+    def delete(self):
+        # Delete nodes made by script
+        if self.rooter_grp and mc.objExists(self.rooter_grp):
+            self.remove_time_warps()
+            mc.delete(self.rooter_grp)
+        self.delete_locators()
+
+        if self.rig_id:
+            AimRigRegistry().remove(self.rig_id)
+
+        self.rooter_grp = None
+        self.ctrl_constraints = []
+        self.node_keys = {}
+
+    def delete_constraints(self):
+        existing = [con for con in self.ctrl_constraints if mc.objExists(con)]
+        if existing:
+            mc.delete(existing, constraints=True)
+
+    def offset_shifts(self):
+        # Shift per control, the first one is only shifted if 'include first' is on
+        return aim_solver.offset_profile(len(self.targetLocList), self.config.offset, self.config.offset_profile,
+                                         self.config.exponent, self.config.include_first,
+                                         self.config.offset_table).tolist()
+
+    def target_curves(self):
+        # Curves per target locator, found with one query for the whole chain
+        if self.target_curve_list is not None and len(self.target_curve_list) == len(self.targetLocList):
+            return self.target_curve_list
+
+        index = dict((loc, i) for i, loc in enumerate(self.targetLocList))
+        self.target_curve_list = [[] for _ in self.targetLocList]
+
+        connections = mc.listConnections(self.targetLocList, type="animCurve", destination=0, connections=1) or []
+        for plug, curve in zip(connections[::2], connections[1::2]):
+            i = index.get(plug.split(".")[0])
+            if i is not None:
+                self.target_curve_list[i].append(curve)
+
+        return self.target_curve_list
+
+    def shift_targets(self, shifts):
+        # Relative shift per target, all curves in one API edit
+        table = dict((curve, shift) for curves, shift in zip(self.target_curves(), shifts) if shift
+                     for curve in curves or [])
+        if table:
+            shift_curves(table)
+
+    def applied_shifts(self):
+        # Offset ledger, the absolute shift on each target is kept on the locator itself
+        return [mc.getAttr(loc + ".aimShift") if mc.attributeQuery("aimShift", node=loc, exists=1) else 0.0
+                for loc in self.targetLocList]
+
+    def record_shifts(self, shifts):
+        for loc, shift in zip(self.targetLocList, shifts):
+            if not mc.attributeQuery("aimShift", node=loc, exists=1):
+                mc.addAttr(loc, longName="aimShift", attributeType="double")
+            mc.setAttr(loc + ".aimShift", shift)
+
+    def set_key_shifts(self, shifts):
+        # Move the target keys to absolute shifts, only the difference to the ledger is applied
+        applied = self.applied_shifts()
+        self.shift_targets([shift - old for shift, old in zip(shifts, applied)])
+        self.record_shifts(shifts)
+
+    def set_shifts(self, shifts):
+        if self.config.offset_mode == "timewarp":
+            # Keys go back to their baked timing, the warps carry the whole shift
+            self.set_key_shifts([0.0] * len(shifts))
+            self.warp_targets(shifts)
+        else:
+            self.remove_time_warps()
+            self.set_key_shifts(shifts)
+
+    def time_warps(self):
+        # animCurveTT feeding each target's curves, None for targets on scene time
+        warps = []
+        for curves in self.target_curves():
+            warp = None
+            if curves:
+                warp = mc.listConnections(curves[0] + ".input", destination=0, type="animCurveTT")
+            warps.append(warp[0] if warp else None)
+        return warps
+
+    def warp_shifts(self):
+        return [-mc.getAttr(warp + ".ktv[0].keyValue") if warp else 0.0 for warp in self.time_warps()]
+
+    def warp_targets(self, shifts):
+        # A linear time curve per target, output = time - shift, so a new shift is one setAttr
+        for loc, curves, warp, shift in zip(self.targetLocList, self.target_curves(), self.time_warps(), shifts):
+            if not curves or not (warp or shift):
+                continue
+
+            if warp:
+                mc.setAttr(warp + ".ktv[0:1]", 0, -shift, 1, 1 - shift)
+                continue
+
+            warp = mc.createNode("animCurveTT", name=short_name(loc) + "_timeWarp", skipSelect=True)
+            mc.setAttr(warp + ".ktv[0:1]", 0, -shift, 1, 1 - shift)
+            mc.keyTangent(warp, edit=1, inTangentType="linear", outTangentType="linear")
+            mc.setInfinity(warp, preInfinity="linear", postInfinity="linear")
+
+            for curve in curves:
+                mc.connectAttr(warp + ".output", curve + ".input", force=True)
+
+    def remove_time_warps(self, indices=None):
+        # The target curves go back on scene time
+        warps = [warp for i, warp in enumerate(self.time_warps()) if warp and (indices is None or i in indices)]
+        if warps:
+            mc.delete(warps)
+
+    @heavy_stage
+    def offset_locs(self):
+        self.set_shifts(self.offset_shifts())
+
+    @heavy_stage
+    def undo_offset(self):
+        self.set_shifts([0.0] * len(self.targetLocList))
+
+    @heavy_stage
+    def solve_bake(self, shifts=None):
+        # Bake the aim result straight onto the controls with aim_solver, no locators or constraints
+        if self.aim_rig:
+            raise RuntimeError("Controls are driven by the aim rig, delete it before solving")
+
+        ctrls = self.config.chain_ctrls
+        specs = self.make_specs()
+        start, end = self.bake_time_range()
+        frames = np.arange(int(start), int(end) + 1)
+
+        ctrl_matrices = sample_matrices(ctrls, "worldMatrix[0]", frames)
+        parent_matrices = sample_matrices(ctrls, "parentMatrix[0]", frames)
+
+        space_matrices = None
+        if shifts is not None and self.config.space:
+            space_matrices = sample_matrices([self.config.space], "worldMatrix[0]", frames)[:, 0]
+
+        offset_vectors = [spec.offset_vector for spec in specs]
+        targets = aim_solver.target_positions(ctrl_matrices, offset_vectors, space_matrices, shifts)
+
+        parents = chain_parents(ctrls)
+        solved = aim_solver.solve_chain(ctrl_matrices, targets,
+                                        [spec.aim_vector for spec in specs],
+                                        [spec.up_vector for spec in specs],
+                                        parents=parents)
+        parent_solved = aim_solver.moved_parents(parent_matrices, ctrl_matrices, solved, parents)
+
+        rotate_orders = [mc.getAttr(ctrl + ".rotateOrder") for ctrl in ctrls]
+        rotate_axis = np.array([mc.getAttr(ctrl + ".rotateAxis")[0] for ctrl in ctrls])
+        joint_orient = np.array([mc.getAttr(ctrl + ".jointOrient")[0] if mc.nodeType(ctrl) == "joint"
+                                 else (0, 0, 0) for ctrl in ctrls])
+
+        values = aim_solver.rotate_values(solved, parent_solved, rotate_orders, rotate_axis, joint_orient)
+
+        channels = [(spec, i, "{0}.rotate{1}".format(spec.ctrl, axis.upper()))
+                    for spec in specs for i, axis in enumerate("xyz") if axis not in spec.skip]
+
+        self.snapshot = CurveSnapshot([plug for _, _, plug in channels]) if self.config.fast_undo else None
+
+        with undo_suspended(self.config.fast_undo):
+            curves = [set_curve_keys(plug, frames, values[:, spec.index, i]) for spec, i, plug in channels]
+            self.reduce_curves(curves)
+
+    #Bakeing
+    @heavy_stage
+    def bake_all(self, stay_constrained=False):
+        sel = self.config.chain_ctrls
+        # The rotate channels the rig drives
+        plugs = [ctrl + attr for ctrl in sel for attr in (".rotateX", ".rotateY", ".rotateZ")
+                 if not mc.getAttr(ctrl + attr, lock=1)]
+
+        self.snapshot = CurveSnapshot(plugs) if self.config.fast_undo else None
+
+        with undo_suspended(self.config.fast_undo):
+            self.bake_to_layer(sel, plugs)
+
+        if not stay_constrained:
+            self.delete_constraints()
+            self.delete()
+
+    def bake_to_layer(self, sel, plugs):
+        # One bakeResults of plugs, onto a single override layer or the base curves
+        layered = bool(mc.animLayer(sel, q=1, affectedLayers=1))
+        time_range = self.cascade_time_range()
+
+        # Base curves under other layers would be composited twice, those chains still go to a layer
+        if not (self.config.bake_layer or layered):
+            mc.bakeResults(plugs, time=time_range, preserveOutsideKeys=True)
+            self.reduce_curves(mc.keyframe(plugs, q=1, name=1) or [])
+            return
+
+        bake_lyr = "AimTail_offset{0}_bk_lyr".format(int(self.config.offset))
+        if not mc.animLayer(bake_lyr, q=1, exists=1):
+            bake_lyr = mc.animLayer(bake_lyr, override=1)
+            if self.snapshot:
+                self.snapshot.layers.append(bake_lyr)
+        mc.animLayer(bake_lyr, e=1, attribute=plugs)
+
+        mc.bakeResults(plugs, time=time_range, destinationLayer=bake_lyr, preserveOutsideKeys=True)
+        self.reduce_curves(mc.animLayer(bake_lyr, q=1, animCurves=1) or [])
+
+    @single_undo
+    def restore_snapshot(self):
+        # Put the controls back the way they were before the last fast_undo bake
+        if self.snapshot:
+            self.snapshot.restore()
+            self.snapshot = None
+
+
+def uuid_node(node_id, long=True):
+    # Current name of the node with this UUID, None if it's gone
+    if not node_id:
+        return None
+    nodes = mc.ls(node_id, long=long)
+    return nodes[0] if nodes else None
+
+
+class AimRigRegistry(object):
+    """
+    Index of the aim rigs in the scene, stored as JSON on a network node.
+    Rigs are keyed by id and their nodes are kept as UUIDs, so a rig is
+    found without searching the scene by name
+    """
+
+    NODE = "aimChainRegistry"
+
+    # Builder attribute -> single node or list of nodes
+    NODE_ATTRS = ["rooter_grp", "hooked_up_grp", "sphere_grp"]
+    NODE_LIST_ATTRS = ["offsetLocList", "rootLocList", "targetLocList", "tipLocList", "aim_constraints",
+                       "ctrl_constraints"]
+
+    # [JSON last read or saved, rigs parsed from it, their ctrl index], shared by every registry
+    # so the JSON is only parsed again when the node changed, e.g. by undo or a new scene
+    _cache = [None, {}, {}]
+
+    def __init__(self):
+        text = mc.getAttr(self.NODE + ".rigs") if mc.objExists(self.NODE) else None
+        if text != self._cache[0]:
+            rigs = json.loads(text or "{}")
+            ctrl_index = {}
+            for rig_id, record in rigs.items():
+                for key in self.ctrl_keys(record):
+                    ctrl_index[key] = rig_id
+            AimRigRegistry._cache[:] = [text, rigs, ctrl_index]
+
+        self.rigs = self._cache[1]
+        # {ctrl UUID: rig_id}, controls of rigs from before UUIDs were recorded by name
+        self.ctrl_index = self._cache[2]
+
+    @staticmethod
+    def ctrl_keys(record):
+        ctrls = record["config"]["chain_ctrls"]
+        node_ids = record.get("ctrl_ids") or [None] * len(ctrls)
+        return [node_id or ctrl for node_id, ctrl in zip(node_ids, ctrls)]
+
+    def save(self):
+        if not mc.objExists(self.NODE):
+            mc.createNode("network", name=self.NODE, skipSelect=True)
+            mc.addAttr(self.NODE, longName="rigs", dataType="string")
+
+        text = json.dumps(self.rigs)
+        mc.setAttr(self.NODE + ".rigs", text, type="string")
+        self._cache[0] = text
+
+    def register(self, builder):
+        node_keys = builder.track_nodes()
+        record = {"config": builder.config.to_dict(), "ctrl_ids": node_keys["chain_ctrls"],
+                  "ctrl_skips": builder.ctrl_skips}
+
+        for attr in self.NODE_ATTRS + self.NODE_LIST_ATTRS:
+            record[attr] = node_keys[attr]
+
+        self.rigs[builder.rig_id] = record
+        for key in self.ctrl_keys(record):
+            self.ctrl_index[key] = builder.rig_id
+
+        self.save()
+
+    def remove(self, rig_id):
+        record = self.rigs.pop(rig_id, None)
+        if record is None:
+            return
+
+        for key in self.ctrl_keys(record):
+            if self.ctrl_index.get(key) == rig_id:
+                del self.ctrl_index[key]
+
+        self.save()
+
+    def rig_ids(self):
+        return list(self.rigs)
+
+    def rigs_for_ctrls(self, ctrls):
+        # One ls for the controls asked about, names still match rigs that have no UUIDs
+        keys = set(mc.ls(ctrls, uuid=1) or []).union(ctrls) if ctrls else set()
+        return set(self.ctrl_index[key] for key in keys if key in self.ctrl_index)
+
+    def config(self, rig_id):
+        # Config of a rig, its controls found by UUID so renamed ones are under their new name
+        record = self.rigs[rig_id]
+        config = dict(record["config"])
+
+        chain = [uuid_node(node_id, long=False) or ctrl
+                 for node_id, ctrl in zip(record.get("ctrl_ids", []), config["chain_ctrls"])]
+        if chain and chain != config["chain_ctrls"]:
+            renamed = dict((old, new) for old, new in zip(config["chain_ctrls"], chain) if old != new)
+            config["overrides"] = renamed_overrides(config.get("overrides", {}), renamed)
+            config["chain_ctrls"] = chain
+
+        return AimChainConfig.from_dict(config)
+
+    def builder(self, rig_id):
+        # AimChainBuilder for a registered rig, ready to offset, bake or delete
+        record = self.rigs[rig_id]
+
+        builder = AimChainBuilder(self.config(rig_id))
+        builder.rig_id = rig_id
+
+        for attr in self.NODE_ATTRS:
+            setattr(builder, attr, uuid_node(record[attr]))
+        for attr in self.NODE_LIST_ATTRS:
+            setattr(builder, attr, [uuid_node(node_id) for node_id in record.get(attr, [])])
+        builder.ctrl_skips = record.get("ctrl_skips", [])
+        builder.track_nodes()
+
+        return builder
+
+    def prune(self):
+        # Forget rigs whose group was deleted by hand
+        for rig_id in list(self.rigs):
+            if not uuid_node(self.rigs[rig_id]["rooter_grp"]):
+                self.remove(rig_id)
+
+
+def build_chains(configs):
+    """
+    Build several aim rigs with a single bake of all their locators.
+    Returns the builders, in the order of configs
+    """
+    seen = set()
+    for config in configs:
+        shared = seen.intersection(config.chain_ctrls)
+        if shared:
+            raise ValueError("Controls are in more than one chain: {0}".format(sorted(shared)))
+        seen.update(config.chain_ctrls)
+
+    builders = [AimChainBuilder(config) for config in configs]
+    evaluation_mode = next((config.evaluation_mode for config in configs if config.evaluation_mode), None)
+
+    with undo_chunk("aimChain_build_chains"), performance_scope(evaluation_mode):
+        prepared = [builder.prepare() for builder in builders]
+
+        # All chains must be baked before any of them gets constrained
+        bake([bakee for chain_bakees, _ in prepared for bakee in chain_bakees],
+             merge_ranges([builder.bake_time_range() for builder in builders]))
+
+        for builder, (_, tempConstraints) in zip(builders, prepared):
+            builder.finish(tempConstraints)
+
+    return builders
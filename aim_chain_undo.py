@@ -0,0 +1,79 @@
+"""
+Maya plugin with a single command, aimChainUndoable, that puts OpenMaya
+edits (a DAG modifier, anim curve changes) on the undo queue.
+
+aim_chain_engine imports this as a module and loads the same file as a
+plugin. The command picks up the edits run_undoable queued on the
+imported module, so the plugin and the engine share one queue
+"""
+
+import os
+
+import maya.api.OpenMaya as om2
+import maya.cmds as mc
+
+
+COMMAND = "aimChainUndoable"
+PLUGIN = os.path.splitext(os.path.basename(__file__))[0]
+
+# (do, undo, redo) for the next aimChainUndoable call
+pending = []
+
+
+def maya_useNewAPI():
+    pass
+
+
+class AimChainUndoableCmd(om2.MPxCommand):
+
+    def __init__(self):
+        super(AimChainUndoableCmd, self).__init__()
+
+        self.undo = None
+        self.redo = None
+
+    @staticmethod
+    def creator():
+        return AimChainUndoableCmd()
+
+    def doIt(self, args):
+        # Loaded as a plugin this is a copy of the module, the queue is on the imported one
+        import aim_chain_undo
+
+        if not aim_chain_undo.pending:
+            raise RuntimeError("{0} is only called by run_undoable".format(COMMAND))
+
+        do, self.undo, self.redo = aim_chain_undo.pending.pop()
+        do()
+
+    def undoIt(self):
+        self.undo()
+
+    def redoIt(self):
+        self.redo()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om2.MFnPlugin(plugin).registerCommand(COMMAND, AimChainUndoableCmd.creator)
+
+
+def uninitializePlugin(plugin):
+    om2.MFnPlugin(plugin).deregisterCommand(COMMAND)
+
+
+def run_undoable(do, undo, redo=None):
+    """
+    Call do() through the aimChainUndoable command. Maya calls undo() and
+    redo(), do() again by default, when the command is undone and redone
+    """
+    if not mc.pluginInfo(PLUGIN, q=1, loaded=1):
+        mc.loadPlugin(os.path.splitext(__file__)[0] + ".py", quiet=True)
+
+    pending.append((do, undo, redo or do))
+    try:
+        getattr(mc, COMMAND)()
+    finally:
+        del pending[:]
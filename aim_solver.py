@@ -0,0 +1,278 @@
+"""
+Pure NumPy version of the aim rig, so a chain can be solved for every
+frame at once instead of being scrubbed through constraints and baked.
+
+Matrices use Maya's layout: row vectors, axes in rows 0-2 and translation
+in row 3, so a (frames, controls, 4, 4) array can be filled straight from
+worldMatrix samples.
+"""
+
+import numpy as np
+
+
+# Maya rotateOrder enum -> axis indices, first applied axis first
+ROTATE_ORDERS = {
+    0: (0, 1, 2),  # xyz
+    1: (1, 2, 0),  # yzx
+    2: (2, 0, 1),  # zxy
+    3: (0, 2, 1),  # xzy
+    4: (1, 0, 2),  # yxz
+    5: (2, 1, 0),  # zyx
+}
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=float)
+    length = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(length == 0.0, 1.0, length)
+
+
+def rotation_part(matrices):
+    # Strip scale and shear, rows become unit axes
+    return normalize(np.asarray(matrices, dtype=float)[..., :3, :3])
+
+
+def frame_from_vectors(aim, up):
+    # Rows: aim, up made perpendicular to aim, and aim x up
+    aim = normalize(aim)
+    up = normalize(up - np.sum(up * aim, axis=-1, keepdims=True) * aim)
+    return np.stack([aim, up, np.cross(aim, up)], axis=-2)
+
+
+def aim_rotations(positions, targets, world_up, aim_vectors, up_vectors):
+    """
+    Same result as an aimConstraint with worldUpType "objectrotation".
+
+    positions, targets, world_up are (..., 3) world space arrays, aim_vectors
+    and up_vectors are the local vectors (3,) or broadcastable to (..., 3).
+    Returns (..., 3, 3) world rotations.
+    """
+    positions = np.asarray(positions, dtype=float)
+    aim_vectors = np.broadcast_to(np.asarray(aim_vectors, dtype=float), positions.shape)
+    up_vectors = np.broadcast_to(np.asarray(up_vectors, dtype=float), positions.shape)
+
+    local = frame_from_vectors(aim_vectors, up_vectors)
+    world = frame_from_vectors(np.asarray(targets, dtype=float) - positions, np.asarray(world_up, dtype=float))
+
+    # local @ R == world, local is orthonormal
+    return np.matmul(np.swapaxes(local, -1, -2), world)
+
+
+def target_positions(ctrl_matrices, offset_vectors, space_matrices=None, shifts=None):
+    """
+    Where the aim_tip locators sit: each control's original matrix offset
+    in object space, optionally time shifted inside the space.
+
+    ctrl_matrices is (frames, controls, 4, 4), offset_vectors (controls, 3),
+    space_matrices (frames, 4, 4) and shifts (controls,) in frames.
+    """
+    ctrl_matrices = np.asarray(ctrl_matrices, dtype=float)
+    offsets = np.asarray(offset_vectors, dtype=float)
+
+    rotations = rotation_part(ctrl_matrices)
+    targets = ctrl_matrices[..., 3, :3] + np.einsum("ci,fcij->fcj", offsets, rotations)
+
+    if shifts is None or not np.any(shifts):
+        return targets
+
+    if space_matrices is not None:
+        space_matrices = np.asarray(space_matrices, dtype=float)
+        space_inverse = np.linalg.inv(space_matrices)
+        targets = transform_points(targets, space_inverse[:, None])
+
+    frames = np.arange(targets.shape[0], dtype=float)
+    shifted = np.empty_like(targets)
+    for c, shift in enumerate(shifts):
+        for axis in range(3):
+            # Curves hold their first/last values outside the keyed range
+            shifted[:, c, axis] = np.interp(frames - shift, frames, targets[:, c, axis])
+
+    if space_matrices is not None:
+        shifted = transform_points(shifted, space_matrices[:, None])
+
+    return shifted
+
+
+# Shape of the cascade along the chain, t runs 0-1 from the first to the last shifted control
+EASES = {
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: 1.0 - (1.0 - t) ** 2,
+    "ease_in_out": lambda t: t * t * (3.0 - 2.0 * t),
+}
+
+OFFSET_PROFILES = ("linear", "exponential", "table") + tuple(sorted(EASES))
+
+
+def offset_profile(count, offset, mode="linear", exponent=0.0, include_first=False, table=None):
+    """
+    Time shift of every control of a chain in frames, as a (count,) array.
+
+    linear       offset * (1 + exponent) more per control, the original cascade
+    exponential  every control's step is (1 + exponent) times the previous one
+    ease_*       the linear cascade's last shift, eased along the chain
+    table        shifts given per control, resampled to the chain's length
+    """
+    if mode == "table":
+        if table is None or len(table) == 0:
+            table = [0.0]
+        table = np.asarray(table, dtype=float)
+        return np.interp(np.linspace(0.0, 1.0, count), np.linspace(0.0, 1.0, len(table)), table)
+
+    # Steps from the first control, which is only shifted with include_first
+    steps = np.arange(count, dtype=float) + (1.0 if include_first else 0.0)
+
+    if mode == "linear":
+        return offset * (1.0 + exponent) * steps
+
+    if mode == "exponential":
+        growth = 1.0 + exponent
+        if growth == 1.0:
+            return offset * steps
+        return offset * (growth ** steps - 1.0) / (growth - 1.0)
+
+    if mode in EASES:
+        last = steps[-1] if count else 0.0
+        if not last:
+            return np.zeros(count)
+        return offset * (1.0 + exponent) * last * EASES[mode](steps / last)
+
+    raise ValueError("Unknown offset profile: {0}".format(mode))
+
+
+def transform_points(points, matrices):
+    return np.einsum("...i,...ij->...j", points, matrices[..., :3, :3]) + matrices[..., 3, :3]
+
+
+def chain_parents(count):
+    # Each control is a descendant of the previous one
+    return [-1] + list(range(count - 1))
+
+
+def solve_chain(ctrl_matrices, targets, aim_vectors, up_vectors, world_up_vectors=None, parents=None):
+    """
+    Solve the whole rig: every control is point locked to where its (already
+    aimed) parent control carries it and orient constrained to its aim result.
+
+    ctrl_matrices is the original (frames, controls, 4, 4) animation, targets
+    (frames, controls, 3), aim/up vectors (controls, 3). parents holds the
+    index of the chain control each control follows, -1 for none.
+    Returns the new (frames, controls, 4, 4) world matrices.
+    """
+    ctrl_matrices = np.asarray(ctrl_matrices, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    aim_vectors = np.asarray(aim_vectors, dtype=float)
+    up_vectors = np.asarray(up_vectors, dtype=float)
+    if world_up_vectors is None:
+        world_up_vectors = up_vectors
+    world_up_vectors = np.asarray(world_up_vectors, dtype=float)
+
+    count = ctrl_matrices.shape[1]
+    if parents is None:
+        parents = chain_parents(count)
+
+    rotations = rotation_part(ctrl_matrices)
+    scales = np.linalg.norm(ctrl_matrices[..., :3, :3], axis=-1)
+
+    # Root locators keep the original rotation, so the world up follows it
+    world_up = np.einsum("ci,fcij->fcj", world_up_vectors, rotations)
+
+    solved = np.array(ctrl_matrices)
+    for c in range(count):
+        parent = parents[c]
+        if parent >= 0:
+            # Keep the original offset from the parent control
+            local = np.matmul(ctrl_matrices[:, c], np.linalg.inv(ctrl_matrices[:, parent]))
+            solved[:, c] = np.matmul(local, solved[:, parent])
+
+        position = solved[:, c, 3, :3]
+        rotation = aim_rotations(position, targets[:, c], world_up[:, c], aim_vectors[c], up_vectors[c])
+
+        solved[:, c, :3, :3] = rotation * scales[:, c, :, None]
+        solved[:, c, 3, :3] = position
+
+    return solved
+
+
+def moved_parents(parent_matrices, ctrl_matrices, solved, parents):
+    """
+    parentMatrix of every control once the chain control above it has
+    been moved to its solved matrix
+    """
+    moved = np.array(parent_matrices, dtype=float)
+    for c, parent in enumerate(parents):
+        if parent >= 0:
+            follow = np.matmul(np.linalg.inv(ctrl_matrices[:, parent]), solved[:, parent])
+            moved[:, c] = np.matmul(moved[:, c], follow)
+
+    return moved
+
+
+def euler_to_matrix(angles, rotate_order=0):
+    """
+    (..., 3) degrees to (..., 3, 3) rotations, for Maya's rotate orders
+    """
+    radians = np.radians(np.asarray(angles, dtype=float))
+    matrix = np.broadcast_to(np.eye(3), radians.shape[:-1] + (3, 3))
+
+    for axis in ROTATE_ORDERS[rotate_order]:
+        cos = np.cos(radians[..., axis])
+        sin = np.sin(radians[..., axis])
+        b, c = (axis + 1) % 3, (axis + 2) % 3
+
+        single = np.zeros(radians.shape[:-1] + (3, 3))
+        single[..., axis, axis] = 1.0
+        single[..., b, b] = cos
+        single[..., c, c] = cos
+        single[..., b, c] = sin
+        single[..., c, b] = -sin
+
+        matrix = np.matmul(matrix, single)
+
+    return matrix
+
+
+def matrix_to_euler(rotations, rotate_order=0, unwrap=True):
+    """
+    (..., 3, 3) rotations to (..., 3) degrees. With unwrap the first axis is
+    treated as frames and 360 flips between frames are removed.
+    """
+    # Transposed, the rotation is column-vector R_k R_j R_i
+    col = np.swapaxes(np.asarray(rotations, dtype=float), -1, -2)
+    i, j, k = ROTATE_ORDERS[rotate_order]
+    sign = 1.0 if (j - i) % 3 == 1 else -1.0
+
+    angles = np.empty(col.shape[:-2] + (3,))
+    angles[..., j] = np.arcsin(np.clip(-sign * col[..., k, i], -1.0, 1.0))
+    angles[..., i] = np.arctan2(sign * col[..., k, j], col[..., k, k])
+    angles[..., k] = np.arctan2(sign * col[..., j, i], col[..., i, i])
+
+    if unwrap and angles.ndim > 1:
+        angles = np.unwrap(angles, axis=0)
+
+    return np.degrees(angles)
+
+
+def rotate_values(world, parent_world, rotate_orders, rotate_axis=None, joint_orient=None):
+    """
+    Turn solved world matrices into the controls' rotate channel values.
+
+    world and parent_world are (frames, controls, 4, 4), rotate_orders a
+    list of Maya rotateOrder values, rotate_axis and joint_orient optional
+    (controls, 3) degrees. Returns (frames, controls, 3) degrees.
+    """
+    local = np.matmul(rotation_part(world), np.linalg.inv(rotation_part(parent_world)))
+
+    count = local.shape[1]
+    values = np.empty(local.shape[:2] + (3,))
+    for c in range(count):
+        rotation = local[:, c]
+
+        # Local rotation is rotateAxis * rotate * jointOrient
+        if rotate_axis is not None:
+            rotation = np.matmul(euler_to_matrix(rotate_axis[c]).T, rotation)
+        if joint_orient is not None:
+            rotation = np.matmul(rotation, euler_to_matrix(joint_orient[c]).T)
+
+        values[:, c] = matrix_to_euler(rotation, rotate_orders[c])
+
+    return values
@@ -9,6 +9,8 @@ from PySide2 import QtGui
 import maya.OpenMayaUI as omui
 import maya.cmds as mc
 
+from aim_chain_engine import AimChainConfig, AimChainBuilder, AimRigRegistry, build_chains
+
 
 def maya_main_window():
     """
@@ -134,140 +136,177 @@ class customBut(QtWidgets.QPushButton):
 
         if (event.button() == QtCore.Qt.MouseButton.LeftButton):
             open_slider_dialog.get_sel()
-            open_slider_dialog.make_menus()
 
         elif (event.button() == QtCore.Qt.MouseButton.RightButton):
             if open_slider_dialog.selection:
                 mc.select(open_slider_dialog.selection)
 
 
-class context_menu(QtWidgets.QWidget):
-    def __init__(self, widg, parent=None):
-        super(context_menu, self).__init__(parent)
-
-        self.widg = widg
-        self.checked_tup_dic = {}
-
-    def conjure_menu(self, selection):
-        self.popMenu = QtWidgets.QMenu(self)
-        try:
-            # Dictionary of actions (which are the Checkboxes in practise) from the Qmenu
-            self.menu_actions = {}
-            for i, item in enumerate(selection):
-                self.menu_actions[i] = (QtWidgets.QAction(item, self, checkable=True))
-                self.popMenu.addAction(self.menu_actions[i])
-        except:
-            pass
-
-    def classy_menu(self):
-        # show context menu
-        pos = self.widg1.rect().bottomLeft()
-        self.popMenu.exec_(self.widg1.mapToGlobal(pos))
-
-        # The [0] is to get the True / False return
-        if self.check_if_check(self)[0]:
-            self.widg1.setStyleSheet("QRadioButton { font-weight: bold; color: orange }")
-
-            self.check_if_exclusive_check(self)
-
-        else:
-            self.widg1.setStyleSheet("QRadioButton { font-weight: ; color:  }")
-
-        # Forces colour resets
-        open_slider_dialog.generate_full_checked_list()
-
-
-    def connect_menu(self, widg1):
-        self.widg1 = widg1
-        widg1.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-        widg1.customContextMenuRequested.connect(self.classy_menu)
-
-
-    def get_inside(self, menu, widg):
-        menu_actions = menu.menu_actions
-
-        self.checked_action = []
-        self.checked_tups = []
-
-        for i, each in enumerate(menu_actions):
-            if menu_actions[i].isChecked():
-                self.checked_tup = (widg.text(), menu_actions[i].text())
-
-                self.checked_action.append(widg.text())
-                self.checked_tups.append(self.checked_tup)
-            else:
-                self.checked_tup = None
-
-
-        return self.checked_tups
-
+class OverrideTableModel(QtCore.QAbstractTableModel):
+    """
+    Chain controls against the six axes, a checked cell overrides the
+    control's axis. A control has one override at most
+    """
 
-    def check_if_check(self, menu):
-        # Get the actions (which are the Checkboxes in practise) from the Qmenu
-        self.menu_actions = menu.menu_actions
-        action_list = []
+    AXES = ["x", "y", "z", "-x", "-y", "-z"]
+
+    overrides_changed = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super(OverrideTableModel, self).__init__(parent)
+
+        self.ctrls = []
+        # {ctrl: axis}
+        self.overrides = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.ctrls)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.AXES) + 1
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return "Control" if section == 0 else self.AXES[section - 1]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        ctrl = self.ctrls[index.row()]
+        if index.column() == 0:
+            if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+                return ctrl
+        elif role == QtCore.Qt.CheckStateRole:
+            checked = self.overrides.get(ctrl) == self.AXES[index.column() - 1]
+            return QtCore.Qt.Checked if checked else QtCore.Qt.Unchecked
+        return None
+
+    def flags(self, index):
+        flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        if index.column() > 0:
+            flags |= QtCore.Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if role != QtCore.Qt.CheckStateRole or index.column() == 0:
+            return False
+
+        ctrl = self.ctrls[index.row()]
+        axis = self.AXES[index.column() - 1]
+        if int(value) == int(QtCore.Qt.Checked):
+            self.overrides[ctrl] = axis
+        elif self.overrides.get(ctrl) == axis:
+            del self.overrides[ctrl]
+
+        # The other axes of the row may have been unchecked
+        self.dataChanged.emit(self.index(index.row(), 1), self.index(index.row(), len(self.AXES)))
+        self.overrides_changed.emit()
+        return True
+
+    def set_ctrls(self, ctrls):
+        # Overrides are kept for the controls still in the chain
+        self.beginResetModel()
+        self.ctrls = list(ctrls)
+        self.overrides = dict((ctrl, axis) for ctrl, axis in self.overrides.items() if ctrl in self.ctrls)
+        self.endResetModel()
+        self.overrides_changed.emit()
+
+    def clear_overrides(self):
+        self.beginResetModel()
+        self.overrides = {}
+        self.endResetModel()
+        self.overrides_changed.emit()
+
+
+class ChainListModel(QtCore.QAbstractListModel):
+    """
+    The chain controls in order. Rows are dragged to reorder and can be removed
+    """
 
-        self.widg_action_isChecked_list = []
-        self.action_QTnodes_list = []
+    MIME_TYPE = "application/x-aim-chain-rows"
 
-        for i, action in enumerate(self.menu_actions):
-            checked = self.menu_actions[i].isChecked()
-            action_list.append(checked)
+    def __init__(self, parent=None):
+        super(ChainListModel, self).__init__(parent)
 
-            self.widg_action_isChecked_list.append(checked)
-            self.action_QTnodes_list.append(self.menu_actions[i])
+        self.chain = []
 
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.chain)
 
-        if any(action_list):
-            return True, self.widg_action_isChecked_list, self.action_QTnodes_list
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if index.isValid() and role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return self.chain[index.row()]
+        return None
 
-        else:
-            return False, self.widg_action_isChecked_list, self.action_QTnodes_list
+    def flags(self, index):
+        flags = super(ChainListModel, self).flags(index)
+        if index.isValid():
+            return flags | QtCore.Qt.ItemIsDragEnabled
+        # Drops go between rows only
+        return flags | QtCore.Qt.ItemIsDropEnabled
 
-    def check_if_exclusive_check(self, menus):
-        # Get active (checked) box from click (active menu)
-        for i, action in enumerate(self.widg_action_isChecked_list):
-            if action == True:
-                active_box = i
+    def supportedDropActions(self):
+        return QtCore.Qt.MoveAction
 
-        # Finds all the checked boxes
-        open_slider_dialog.generate_full_checked_list()
+    def mimeTypes(self):
+        return [self.MIME_TYPE]
 
-        curated_action_list = []
+    def mimeData(self, indexes):
+        data = QtCore.QMimeData()
+        rows = " ".join(str(index.row()) for index in indexes)
+        data.setData(self.MIME_TYPE, QtCore.QByteArray(rows.encode("utf-8")))
+        return data
 
-        # Make list of actions with correct active box (dic key)
-        for i in open_slider_dialog.action_QTnodes_dic:
-            # dic[i] is for looping, [active_box] is to access item from the list inside
-            curated_action_list.append(open_slider_dialog.action_QTnodes_dic[i][active_box])
+    def dropMimeData(self, data, action, row, column, parent):
+        if action == QtCore.Qt.IgnoreAction:
+            return True
+        if not data.hasFormat(self.MIME_TYPE):
+            return False
 
-        # Compare newly made list to "current" (self) Qmenu Actions
-        # And remove the current QActions
-        for i in curated_action_list:
-            if i in self.action_QTnodes_list:
-                curated_action_list.remove(i)
+        rows = [int(x) for x in bytes(data.data(self.MIME_TYPE)).decode("utf-8").split()]
+        if row < 0:
+            row = parent.row() if parent.isValid() else len(self.chain)
+        self.move_rows(rows, row)
 
-        for i, each in enumerate(open_slider_dialog.checked_dic):
+        # The move is done, False keeps the view from removing the dragged rows
+        return False
 
-            if open_slider_dialog.checked_dic[i][active_box] == True:
-                # Uncheck repeated action
-                for action in curated_action_list:
-                    action.setChecked(False)
+    def set_chain(self, ctrls):
+        self.beginResetModel()
+        self.chain = list(ctrls)
+        self.endResetModel()
 
+    def ctrls(self):
+        return list(self.chain)
 
-    def reset_text_color(self, menu):
-        if type(menu) is list:
-            for each in menu:
-                each.widg1.setStyleSheet("QRadioButton { font-weight: ; color: }")
-        else:
-            menu.widg1.setStyleSheet("QRadioButton { font-weight: ; color: }")
+    def move_rows(self, rows, destination):
+        rows = sorted(set(rows))
+        moved = [self.chain[row] for row in rows]
+        remaining = [ctrl for row, ctrl in enumerate(self.chain) if row not in rows]
+        destination -= len([row for row in rows if row < destination])
 
+        self.set_chain(remaining[:destination] + moved + remaining[destination:])
 
-### Context Menu Stuff End ###
-##############################
+    def remove_rows(self, rows):
+        # One reset for the lot, so the override table is synced once
+        rows = set(rows)
+        if rows:
+            self.set_chain([ctrl for row, ctrl in enumerate(self.chain) if row not in rows])
 
 
 class OpenSliderDialog(QtWidgets.QDialog):
 
+    # Rig combo data of the "All rigs" item
+    ALL_RIGS = "all"
+
     def __init__(self, parent=maya_main_window()):
         super(OpenSliderDialog, self).__init__(parent)
 
@@ -280,17 +319,16 @@ class OpenSliderDialog(QtWidgets.QDialog):
         self.create_connections()
 
         self.selection = None
-        self.my_locator = None
-        self.temp_slider_locators = None
-        self.temp_loc_list = []
-        self.aim_rig = None
-        self.ctrl_constraints = []
+        self.config = None
+        self.builder = None
         self.exponent = 0
 
-        # Context menu dictionaries
-        self.tup_list = []
-        self.checked_dic = {}
-        self.action_QTnodes_dic = {}
+        # Chains waiting for Build Queue
+        self.queue = []
+        # Builders of the rigs made in this session, {rig_id: builder}
+        self.rig_cache = {}
+
+        self.refresh_rigs()
 
     def create_widgets(self):
         # Locator Slider
@@ -306,11 +344,29 @@ class OpenSliderDialog(QtWidgets.QDialog):
 
         self.make_loc_btn = QtWidgets.QPushButton()
 
+        # Preview updates are applied at most once per frame (~60fps)
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(16)
+        self.pending_distance = None
+
         self.make_loc_btn.setIcon(QtGui.QIcon(":locator.png"))
 
         # Selection Widgets
-        self.sel_line_edit = QtWidgets.QLineEdit()
-        self.sel_line_edit.setEnabled(False)
+        self.chain_model = ChainListModel(self)
+        self.chain_view = QtWidgets.QListView()
+        self.chain_view.setModel(self.chain_model)
+        # Fixed row height, so long chains are laid out lazily
+        self.chain_view.setUniformItemSizes(True)
+        self.chain_view.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.chain_view.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
+        self.chain_view.setFixedHeight(90)
+        self.chain_view.setToolTip("Drag to reorder, Delete to remove")
+
+        self.remove_ctrl_btn = QtWidgets.QPushButton("")
+        self.remove_ctrl_btn.setIcon(QtGui.QIcon(":delete.png"))
+        self.remove_ctrl_btn.setToolTip("Remove the highlighted controls from the chain")
+        self.remove_ctrl_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence.Delete, self.chain_view)
         # self.store_sel_btn = QtWidgets.QPushButton("")
         self.store_sel_btn = customBut(self, "")
         self.store_sel_btn.setIcon(QtGui.QIcon(":selectByObject.png"))
@@ -333,7 +389,39 @@ class OpenSliderDialog(QtWidgets.QDialog):
 
         self.axis_z_btn.setChecked(True)
 
-        self.radio_btn_context_menus_instanes()
+        self.axis_btn_list = [self.axis_x_btn, self.axis_y_btn, self.axis_z_btn,
+                              self.axis_mx_btn, self.axis_my_btn, self.axis_mz_btn]
+
+        # Per control axis overrides, the view only paints the visible rows
+        self.override_model = OverrideTableModel(self)
+        self.override_proxy = QtCore.QSortFilterProxyModel(self)
+        self.override_proxy.setSourceModel(self.override_model)
+        self.override_proxy.setFilterKeyColumn(0)
+        self.override_proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+
+        self.override_search_line_edit = QtWidgets.QLineEdit()
+        self.override_search_line_edit.setPlaceholderText("Filter controls")
+        self.clear_overrides_btn = QtWidgets.QPushButton("Clear")
+
+        self.override_view = QtWidgets.QTableView()
+        self.override_view.setModel(self.override_proxy)
+        self.override_view.verticalHeader().hide()
+        self.override_view.verticalHeader().setDefaultSectionSize(20)
+        self.override_view.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        self.override_view.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        self.override_view.setFixedHeight(150)
+
+        self.collapsible_wdg_overrides = CollapsibleWidget("Axis Overrides")
+
+        override_search_layout = QtWidgets.QHBoxLayout()
+        override_search_layout.addWidget(self.override_search_line_edit)
+        override_search_layout.addWidget(self.clear_overrides_btn)
+
+        override_v_layout = QtWidgets.QVBoxLayout()
+        override_v_layout.addLayout(override_search_layout)
+        override_v_layout.addWidget(self.override_view)
+
+        self.collapsible_wdg_overrides.add_layout(override_v_layout)
 
         self.axis_btn_group = QtWidgets.QButtonGroup()
         self.axis_btn_group.addButton(self.axis_x_btn)
@@ -360,6 +448,18 @@ class OpenSliderDialog(QtWidgets.QDialog):
         self.expo_line_edit.setStyleSheet("QLineEdit { background-color: gray }")
 
         self.include_frist_cb = QtWidgets.QCheckBox("Include 1st control")
+        self.profile_label = QtWidgets.QLabel("Profile:")
+        self.profile_combo = QtWidgets.QComboBox()
+        for label, profile in [("Linear", "linear"), ("Exponential", "exponential"), ("Ease In", "ease_in"),
+                               ("Ease Out", "ease_out"), ("Ease In/Out", "ease_in_out"), ("Table", "table")]:
+            self.profile_combo.addItem(label, profile)
+        self.profile_table_line_edit = QtWidgets.QLineEdit()
+        self.profile_table_line_edit.setPlaceholderText("0, 1, 3, 6")
+        self.profile_table_line_edit.setToolTip("Shift in frames per control, resampled to the chain length")
+        self.profile_table_line_edit.setEnabled(False)
+
+        self.time_warp_cb = QtWidgets.QCheckBox("Time Warp")
+        self.time_warp_cb.setToolTip("Offset through a time curve per control, the baked target keys are not moved")
 
         self.offset_btn = QtWidgets.QPushButton("Offset")
         self.offset_btn.setMaximumWidth(80)
@@ -371,9 +471,31 @@ class OpenSliderDialog(QtWidgets.QDialog):
 
         # Bake Widgets
         self.bake_btn = QtWidgets.QPushButton("Bake")
+        self.solve_btn = QtWidgets.QPushButton("Solve Bake")
+        self.solve_btn.setToolTip("Bake the aim straight onto the controls, without building the rig")
         self.stay_constrained_cb = QtWidgets.QCheckBox("Stay Constrained")
         self.anim_layer_cb = QtWidgets.QCheckBox("To AnimLayer")
+        self.anim_layer_cb.setChecked(True)
+        self.anim_layer_cb.setToolTip("Off: bake onto the base curves, chains already in layers still get one")
         self.timeline_range_cb = QtWidgets.QCheckBox("Use Timeline Range")
+        self.timeline_range_cb.setChecked(True)
+        self.timeline_range_cb.setToolTip("Off: bake only the keyed range of the chain and space")
+
+        self.reduce_keys_cb = QtWidgets.QCheckBox("Reduce Keys")
+        self.reduce_keys_cb.setToolTip("Remove redundant baked keys within the rotate (degrees) / translate tolerance")
+        self.rotate_tol_line_edit = QtWidgets.QLineEdit("0.05")
+        self.rotate_tol_line_edit.setFixedWidth(40)
+        self.translate_tol_line_edit = QtWidgets.QLineEdit("0.01")
+        self.translate_tol_line_edit.setFixedWidth(40)
+
+        self.fast_undo_cb = QtWidgets.QCheckBox("Fast (no undo)")
+        self.fast_undo_cb.setToolTip("Bake with undo off, use Restore to go back to the animation before the bake")
+        self.restore_btn = QtWidgets.QPushButton("Restore")
+
+        # Evaluation manager mode used while building and baking
+        self.eval_mode_combo = QtWidgets.QComboBox()
+        for label, mode in [("Keep current", None), ("DG", "off"), ("Serial", "serial"), ("Parallel", "parallel")]:
+            self.eval_mode_combo.addItem(label, mode)
 
         # Collapsible Widget Stuff
         self.collapsible_wdg_offset = CollapsibleWidget("Offset")
@@ -385,12 +507,17 @@ class OpenSliderDialog(QtWidgets.QDialog):
         offset_grid_layout.addWidget(self.expo_cb, 0, 4, 2, 1)
         offset_grid_layout.addWidget(self.expo_line_edit, 0, 5, 2, 1)
 
+        offset_grid_layout.addWidget(self.profile_label, 2, 0)
+        offset_grid_layout.addWidget(self.profile_combo, 2, 1, 1, 2)
+        offset_grid_layout.addWidget(self.profile_table_line_edit, 2, 3, 1, 3)
+
         offset_grid_layout.setSpacing(12)
         offset_grid_layout.setColumnStretch(2, 1)
         offset_grid_layout.setColumnStretch(6, 1)
 
         offset_btns_layout = QtWidgets.QHBoxLayout()
         offset_btns_layout.addStretch()
+        offset_btns_layout.addWidget(self.time_warp_cb)
         offset_btns_layout.addWidget(self.include_frist_cb)
         offset_btns_layout.addWidget(self.offset_btn)
         offset_btns_layout.addWidget(self.undo_offset_btn, alignment=QtCore.Qt.AlignRight)
@@ -409,19 +536,55 @@ class OpenSliderDialog(QtWidgets.QDialog):
         bake_h_layout = QtWidgets.QHBoxLayout()
         bake_h_layout.setContentsMargins(40, 1, 1, 1)
         bake_h_layout.addWidget(self.stay_constrained_cb)
+        bake_h_layout.addWidget(self.anim_layer_cb)
+        bake_h_layout.addWidget(self.timeline_range_cb)
+
+        reduce_h_layout = QtWidgets.QHBoxLayout()
+        reduce_h_layout.setContentsMargins(40, 1, 1, 1)
+        reduce_h_layout.addWidget(self.reduce_keys_cb)
+        reduce_h_layout.addWidget(QtWidgets.QLabel("Rot:"))
+        reduce_h_layout.addWidget(self.rotate_tol_line_edit)
+        reduce_h_layout.addWidget(QtWidgets.QLabel("Pos:"))
+        reduce_h_layout.addWidget(self.translate_tol_line_edit)
+        reduce_h_layout.addStretch()
+
+        eval_h_layout = QtWidgets.QHBoxLayout()
+        eval_h_layout.setContentsMargins(40, 1, 1, 1)
+        eval_h_layout.addWidget(QtWidgets.QLabel("Evaluation:"))
+        eval_h_layout.addWidget(self.eval_mode_combo)
+        eval_h_layout.addStretch()
+        eval_h_layout.addWidget(self.fast_undo_cb)
+        eval_h_layout.addWidget(self.restore_btn)
 
         bake_v_layout = QtWidgets.QVBoxLayout()
         bake_v_layout.addLayout(bake_h_layout)
+        bake_v_layout.addLayout(reduce_h_layout)
+        bake_v_layout.addLayout(eval_h_layout)
         bake_v_layout.addSpacing(7)
         bake_v_layout.addWidget(self.bake_btn)
+        bake_v_layout.addWidget(self.solve_btn)
 
         self.collapsible_wdg_bake.add_layout(bake_v_layout)
 
         self.spheres_cb = QtWidgets.QCheckBox('Distance locking')
+        self.modifier_build_cb = QtWidgets.QCheckBox("Fast build")
+        self.modifier_build_cb.setToolTip("Create the rig locators and constraints in one OpenMaya modifier")
 
         # Standard Buttons
         self.build_btn = QtWidgets.QPushButton("Build")
         self.delete_btn = QtWidgets.QPushButton("Delete")
+        self.rebuild_sel_btn = QtWidgets.QPushButton("Rebake Sel")
+        self.rebuild_sel_btn.setToolTip("Rebake only the selected controls of their aim rigs")
+
+        # Rig Selection, the rig that Offset / Bake / Delete act on
+        self.rig_combo = QtWidgets.QComboBox()
+
+        # Queue Widgets
+        self.queue_label = QtWidgets.QLabel("Queued chains: 0")
+        self.queue_btn = QtWidgets.QPushButton("Queue")
+        self.queue_btn.setToolTip("Add the current chain and settings to the queue")
+        self.clear_queue_btn = QtWidgets.QPushButton("Clear")
+        self.build_queue_btn = QtWidgets.QPushButton("Build Queue")
         self.close_btn = QtWidgets.QPushButton("Close")
 
 
@@ -433,9 +596,14 @@ class OpenSliderDialog(QtWidgets.QDialog):
         slider_layout.addWidget(self.make_loc_btn)
 
         # Selection Chain Layout
+        sel_btns_layout = QtWidgets.QVBoxLayout()
+        sel_btns_layout.addWidget(self.store_sel_btn)
+        sel_btns_layout.addWidget(self.remove_ctrl_btn)
+        sel_btns_layout.addStretch()
+
         sel_layout = QtWidgets.QHBoxLayout()
-        sel_layout.addWidget(self.sel_line_edit)
-        sel_layout.addWidget(self.store_sel_btn)
+        sel_layout.addWidget(self.chain_view)
+        sel_layout.addLayout(sel_btns_layout)
 
         # Selection Space Layout
         space_layout = QtWidgets.QHBoxLayout()
@@ -457,6 +625,15 @@ class OpenSliderDialog(QtWidgets.QDialog):
 
         self.axis_groupbox.setLayout(self.mirco_layout)
 
+        # Overrides Layout
+        self.overrides_body_wdg = QtWidgets.QWidget()
+        self.overrides_layout = QtWidgets.QVBoxLayout(self.overrides_body_wdg)
+        self.overrides_layout.setContentsMargins(1, 2, 1, 2)
+        self.overrides_layout.setSpacing(3)
+        self.overrides_layout.setAlignment(QtCore.Qt.AlignTop)
+
+        self.overrides_layout.addWidget(self.collapsible_wdg_overrides)
+
         # Offset Layout
         self.offset_body_wdg = QtWidgets.QWidget()
         self.offset_layout = QtWidgets.QVBoxLayout(self.offset_body_wdg)
@@ -481,12 +658,22 @@ class OpenSliderDialog(QtWidgets.QDialog):
         form_layout.addRow("Space Selection:", space_layout)
         form_layout.addRow("Axis Selection:", axis_select_layout)
         form_layout.addRow("Locator Distance:", slider_layout)
+        form_layout.addRow("Aim Rig:", self.rig_combo)
 
         btn_layout1 = QtWidgets.QHBoxLayout()
         btn_layout1.addStretch()
         btn_layout1.addWidget(self.spheres_cb)
+        btn_layout1.addWidget(self.modifier_build_cb)
         btn_layout1.addWidget(self.build_btn)
         btn_layout1.addWidget(self.delete_btn)
+        btn_layout1.addWidget(self.rebuild_sel_btn)
+
+        queue_layout = QtWidgets.QHBoxLayout()
+        queue_layout.addWidget(self.queue_label)
+        queue_layout.addStretch()
+        queue_layout.addWidget(self.queue_btn)
+        queue_layout.addWidget(self.clear_queue_btn)
+        queue_layout.addWidget(self.build_queue_btn)
 
         btn_layout2 = QtWidgets.QHBoxLayout()
         btn_layout2.addStretch()
@@ -496,13 +683,20 @@ class OpenSliderDialog(QtWidgets.QDialog):
         main_layout.addLayout(form_layout)
         main_layout.addSpacing(7)
         main_layout.addLayout(btn_layout1)
+        main_layout.addLayout(queue_layout)
+        main_layout.addWidget(self.overrides_body_wdg)
         main_layout.addWidget(self.offset_body_wdg)
         main_layout.addWidget(self.bake_body_wdg)
 
 
     def create_connections(self):
         self.store_sel_btn.clicked.connect(self.get_sel)
-        self.store_sel_btn.clicked.connect(self.make_menus)
+        self.override_search_line_edit.textChanged.connect(self.override_proxy.setFilterFixedString)
+        self.clear_overrides_btn.clicked.connect(self.override_model.clear_overrides)
+        self.override_model.overrides_changed.connect(self.highlight_override_axes)
+        self.remove_ctrl_btn.clicked.connect(self.remove_chain_ctrls)
+        self.remove_ctrl_shortcut.activated.connect(self.remove_chain_ctrls)
+        self.chain_model.modelReset.connect(self.chain_changed)
 
         self.world_cb.toggled.connect(self.toggle_manuel_space)
         self.store_space_btn.clicked.connect(self.toggle_world_cb)
@@ -514,74 +708,65 @@ class OpenSliderDialog(QtWidgets.QDialog):
         self.make_loc_btn.clicked.connect(self.make_locators)
         # Slider
         self.slider.valueChanged.connect(self.update_line_edit_from_slider)
+        self.slider.sliderReleased.connect(self.apply_preview)
         self.val_line_edit.textChanged.connect(self.update_slider_from_line_edit)
+        self.val_line_edit.editingFinished.connect(self.apply_preview)
+        self.preview_timer.timeout.connect(self.apply_preview)
 
         self.build_btn.clicked.connect(self.get_ui_input)
         self.build_btn.clicked.connect(self.check_sel_exists)
         self.build_btn.clicked.connect(self.make_rig)
         self.delete_btn.clicked.connect(self.delete_rig_stuff)
+        self.rebuild_sel_btn.clicked.connect(self.rebuild_selected)
+
+        self.queue_btn.clicked.connect(self.get_ui_input)
+        self.queue_btn.clicked.connect(self.check_sel_exists)
+        self.queue_btn.clicked.connect(self.queue_chain)
+        self.clear_queue_btn.clicked.connect(self.clear_queue)
+        self.build_queue_btn.clicked.connect(self.build_queue)
 
         self.expo_cb.toggled.connect(self.update_expo_cb)
+        self.profile_combo.currentIndexChanged.connect(self.update_profile_combo)
         self.offset_btn.clicked.connect(self.get_offset_input)
         self.offset_btn.clicked.connect(self.offset_locs)
         self.undo_offset_btn.clicked.connect(self.undo_offset)
 
         self.bake_btn.clicked.connect(self.bake_all)
+        self.solve_btn.clicked.connect(self.get_ui_input)
+        self.solve_btn.clicked.connect(self.check_sel_exists)
+        self.solve_btn.clicked.connect(self.solve_bake)
+        self.restore_btn.clicked.connect(self.restore_snapshot)
 
         self.close_btn.clicked.connect(self.close)
 
 
-    def radio_btn_context_menus_instanes(self):
-        self.cb_menu = context_menu(self.axis_x_btn)
-        self.cb_menu.connect_menu(self.axis_x_btn)
-
-        self.cb2_menu = context_menu(self.axis_y_btn)
-        self.cb2_menu.connect_menu(self.axis_y_btn)
-
-        self.cb3_menu = context_menu(self.axis_z_btn)
-        self.cb3_menu.connect_menu(self.axis_z_btn)
-
-        self.cb4_menu = context_menu(self.axis_mx_btn)
-        self.cb4_menu.connect_menu(self.axis_mx_btn)
-
-        self.cb5_menu = context_menu(self.axis_my_btn)
-        self.cb5_menu.connect_menu(self.axis_my_btn)
-
-        self.cb6_menu = context_menu(self.axis_mz_btn)
-        self.cb6_menu.connect_menu(self.axis_mz_btn)
-
-        self.cb_widg_list = [self.axis_x_btn, self.axis_y_btn, self.axis_z_btn, self.axis_mx_btn, self.axis_my_btn, self.axis_mz_btn]
-        self.cb_menu_list = [self.cb_menu, self.cb2_menu, self.cb3_menu, self.cb4_menu, self.cb5_menu, self.cb6_menu]
-
-
-    def generate_full_checked_list(self):
-        for i, menu in enumerate(self.cb_menu_list):
-            any_checked, self.checked_dic[i], self.action_QTnodes_dic[i] = menu.check_if_check(menu)
-
-            if any_checked == False:
-                # Reset highlight if there's nothing checked in menu
-                menu.reset_text_color(menu)
-
-
     def check_sel_exists(self):
-        if not self.sel_line_edit.text():
+        if not self.chain_model.rowCount():
             self.warning = QtWidgets.QMessageBox.warning(self, "Need selection", "Need selection")
         else:
             return
 
     def get_sel(self):
-        self.selection = mc.ls(sl=1)
-        self.sel_line_edit.setText(str(self.selection))
-        self.sel_line_edit.setStyleSheet("QLineEdit { color: white; background-color: Sienna }")
+        self.chain_model.set_chain(mc.ls(sl=1))
+        self.chain_view.setStyleSheet("QListView { color: white; background-color: Sienna }")
 
+    def chain_changed(self):
+        # The override table follows the chain's order after a reorder or remove
+        self.selection = self.chain_model.ctrls()
+        self.override_model.set_ctrls(self.selection)
 
-    def make_menus(self):
-        for cb in self.cb_menu_list:
-            cb.conjure_menu(self.selection)
+    def remove_chain_ctrls(self):
+        self.chain_model.remove_rows([index.row() for index in self.chain_view.selectedIndexes()])
 
-        # Reset highlights
-        for menu in self.cb_menu_list:
-            menu.reset_text_color(menu)
+
+    def highlight_override_axes(self):
+        # Axes used by an override show in orange
+        used = set(self.override_model.overrides.values())
+        for btn in self.axis_btn_list:
+            if btn.text() in used:
+                btn.setStyleSheet("QRadioButton { font-weight: bold; color: orange }")
+            else:
+                btn.setStyleSheet("QRadioButton { font-weight: ; color:  }")
 
 
     def get_space_sel(self):
@@ -605,44 +790,65 @@ class OpenSliderDialog(QtWidgets.QDialog):
     def update_line_edit_from_slider(self):
         # /2 to have finer increment
         self.slider_val = float(self.slider.value())/2
+
+        # No ping-pong back into update_slider_from_line_edit
+        self.val_line_edit.blockSignals(True)
         self.val_line_edit.setText(str(self.slider_val))
+        self.val_line_edit.blockSignals(False)
+
+        self.schedule_preview()
 
 
     def update_slider_from_line_edit(self):
-        # Update slider UI
-        self.line_edit_value = self.val_line_edit.text()
+        try:
+            self.slider_val = float(self.val_line_edit.text())
+        except ValueError:
+            # Half typed number
+            return
+
         # x2 to counter the halving from slider function
-        self.line_edit_float = float(self.line_edit_value)*2
+        self.slider.blockSignals(True)
+        self.slider.setValue(int(round(self.slider_val*2)))
+        self.slider.blockSignals(False)
 
-        self.slider.setValue(float(self.line_edit_float))
+        self.schedule_preview()
 
-        # Run if locator exists
-        if self.temp_slider_locators:
 
-            for i, ctrl in enumerate(self.chain_ctrls):
-                # Find the overrides
-                if ctrl in self.chain_ctrl_override:
-                    ctrl_index = self.chain_ctrl_override.index(ctrl)
-                    ctrl_axis = self.chain_ctrl_axis_override[ctrl_index]
+    def schedule_preview(self):
+        # Coalesce distance changes, at most one locator update per UI frame
+        self.pending_distance = self.slider_val
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
 
-                    self.offset_override_value = [x * self.slider_val for x in ctrl_axis]
-                    mc.xform(self.temp_loc_list[i], objectSpace=1, translation=self.offset_override_value)
 
-                else:
-                    self.offset_value = [x * self.slider_val for x in self.axis_matrix]
-                    mc.xform(self.temp_loc_list[i], objectSpace=1, translation=self.offset_value)
+    def apply_preview(self):
+        self.preview_timer.stop()
 
-        else:
-            pass
+        if self.pending_distance is None:
+            return
+
+        # Run if the preview exists, one distance node drives every locator
+        if self.builder and self.builder.preview_node:
+            self.builder.update_locators(self.pending_distance)
+        self.pending_distance = None
 
 
     def get_offset_input(self):
         self.offset_multi = float(self.offset_line_edit.text())
         # Converting text unless it's empty
-        if self.expo_line_edit.text():
+        if self.expo_cb.isChecked() and self.expo_line_edit.text():
             self.exponent = float(self.expo_line_edit.text())
         self.include_first = self.include_frist_cb.isChecked()
 
+        self.offset_profile = self.profile_combo.currentData()
+        self.offset_table = None
+        if self.offset_profile == "table":
+            self.offset_table = [float(x) for x in self.profile_table_line_edit.text().replace(",", " ").split()]
+
+
+    def update_profile_combo(self):
+        self.profile_table_line_edit.setEnabled(self.profile_combo.currentData() == "table")
+
 
     def update_expo_cb(self):
         print ("update_expo stuff:")
@@ -657,376 +863,211 @@ class OpenSliderDialog(QtWidgets.QDialog):
 
 
     def get_ui_input(self):
-        self.chain_ctrls = self.sel_line_edit.text()
+        self.config = None
 
-        # Remove 'u' if in earlier version of Maya
-        if sys.version_info.major >= 3:
-            # Convert line edit strings to lists
-            self.chain_ctrls = list(map(str.strip, self.chain_ctrls.strip('][').replace("'", '').split(',')))
-        else:
-            self.chain_ctrls = self.chain_ctrls.strip('][').replace("'", '').split(', ')
-            self.chain_ctrls = [x[1:] for x in self.chain_ctrls]
+        self.chain_ctrls = self.chain_model.ctrls()
+        if not self.chain_ctrls:
+            return
 
         # If space is False world cb is clicked
         if self.world_cb.isChecked():
             self.space = False
         else:
             self.space = self.space_sel_line_edit.text()
-            # self.space = list(map(str.strip, self.space.strip('][').replace('"', '').split(',')))
-
-        self.custom_axis_override()
 
-        # Get slider value
         axis_sel = self.axis_btn_group.checkedButton().text()
-        self.make_axis_matrix(axis_sel)
-
-
-    def make_axis_matrix(self, axis_input):
-
-        self.axis = {
-            "x": (1, 0, 0),
-            "-x": (-1, 0, 0),
-            "y": (0, 1, 0),
-            "-y": (0, -1, 0),
-            "z": (0, 0, 1),
-            "-z": (0, 0, -1),
-        }
-
-        self.axis_matrix = self.axis[axis_input]
-
         self.slider_val = float(self.slider.value())/2
 
-        self.offset_value = [x * self.slider_val for x in self.axis_matrix]
-
-        # Get appropriate up vector
-        self.up_vector = (0, 0, 1)
-        self.world_up_vector = (0, 0, 1)
-
-        if self.axis_matrix in ("z", "-z"):
-            self.up_vector = (0, 1, 0)
-            self.world_up_vector = (0, 1, 0)
-
-        return self.axis_matrix
+        self.config = AimChainConfig(self.chain_ctrls, space=self.space, axis=axis_sel,
+                                     overrides=dict(self.override_model.overrides), distance=self.slider_val,
+                                     spheres=self.spheres_cb.isChecked(), bake_range=self.bake_range(),
+                                     modifier_build=self.modifier_build_cb.isChecked(),
+                                     evaluation_mode=self.eval_mode_combo.currentData(),
+                                     fast_undo=self.fast_undo_cb.isChecked(),
+                                     **self.reduce_settings())
 
-    def custom_axis_override(self):
-        tup_list = []
-        for i, menu in enumerate(self.cb_menu_list):
-            tup = menu.get_inside(self.cb_menu_list[i], self.cb_widg_list[i])
-            if tup != []:
-                tup_list.append(tup)
+    def reduce_settings(self):
+        return {"reduce_keys": self.reduce_keys_cb.isChecked(),
+                "rotate_tolerance": float(self.rotate_tol_line_edit.text() or 0),
+                "translate_tolerance": float(self.translate_tol_line_edit.text() or 0)}
 
-        # Remove nested lists
-        tup_clean = [val for sublist in tup_list for val in sublist]
-
-        self.chain_ctrl_override = [name[1] for name in tup_clean]
-        self.chain_ctrl_key_override = [name[0] for name in tup_clean]
-
-        self.chain_ctrl_axis_override = []
-        # GET THE LETTER (X,Y,Z)
-        for pair in tup_clean:
-            axis = self.make_axis_matrix(pair[0])
-            self.chain_ctrl_axis_override.append(axis)
-
-        if self.chain_ctrl_axis_override != []:
-            print("chain_ctrl_axis_override ", self.chain_ctrl_axis_override)
+    def bake_range(self):
+        if self.timeline_range_cb.isChecked():
+            return "timeline"
+        return "keys"
 
     # Slider temp locators
     def make_locators(self):
-        # Check if locators already exist
-
-        # Check if build rig has been run
-        if self.aim_rig:
-            return
-
         # Check for selection in line edit
-        if not self.sel_line_edit.text():
+        if not self.config:
             return
 
-        # Delete temp locators if they exist
-        if self.temp_slider_locators:
-            try:
-                mc.delete(self.temp_loc_list)
-            except:
-                pass
-
-        # Set temp loc check to True and reset temp loc list
-        self.temp_slider_locators = True
-        self.temp_loc_list = []
-
-
-        for ctrl in self.chain_ctrls:
-            temp_loc = mc.spaceLocator(n=ctrl + "temp_aim_target")
-            self.temp_loc_list.append(temp_loc[0])
-
-            # Position locators to ctrls
-            mc.parent(temp_loc, ctrl)
-            mc.makeIdentity(temp_loc, apply=0, t=1, r=1, s=1)
-
-            # Multiply slider value by axis matrix
-            if ctrl in self.chain_ctrl_override:
-                ctrl_index = self.chain_ctrl_override.index(ctrl)
-                ctrl_axis = self.chain_ctrl_axis_override[ctrl_index]
-
-                offset_value = [x * self.slider_val for x in ctrl_axis]
-                mc.xform(temp_loc, relative=1, objectSpace=1, translation=offset_value)
-
-            else:
-                self.offset_value = [x * self.slider_val for x in self.axis_matrix]
-                mc.xform(temp_loc, relative=1, objectSpace=1, translation=self.offset_value)
-
+        # Check if build rig has been run on this chain
+        if AimRigRegistry().rigs_for_ctrls(self.config.chain_ctrls):
+            return
 
-##################################################################################
-############################# Building Rig Stuff #################################
-##################################################################################
+        # Existing temp locators are reused for controls still in the chain
+        self.preview_builder().make_locators()
 
-    def check_if_rig_exists(self):
-        if mc.objExists('collection_Aim_Loc_Grp'):
-            mc.delete('collection_Aim_Loc_Grp')
+    def preview_builder(self):
+        # Keep the builder holding the temp locators, so they are pooled and handed to the build
+        if self.builder and not self.builder.aim_rig:
+            self.builder.config = self.config
         else:
-            pass
-
-    def myBake(self, bakee, space_obj=None):
-        minTime = mc.playbackOptions(q=1, minTime=1)
-        maxTime = mc.playbackOptions(q=1, maxTime=1)
-
-        timeSliderRange = minTime, maxTime
-
-        # Find first and last keys
-        try:
-            # Use existing Key Range for Bake
-            # fullKeyList = sorted(mc.keyframe(space_obj, q=1))
-            # firstLastKeys = fullKeyList[0], fullKeyList[-1]
-            mc.bakeResults(bakee, time=timeSliderRange, preserveOutsideKeys=1)
-
-        except:
-            print("No keys?")
-            pass
+            self.builder = AimChainBuilder(self.config)
 
+        return self.builder
 
     def make_rig(self):
-        print("make_rig is now")
-        self.check_if_rig_exists()
-        self.aim_rig = True
-
-        self.offsetLocList = []
-        self.rootLocList = []
-        self.targetLocList = []
-
-        self.bakees = []
-        tempConstraints = []
-
-        # Delete guide locators
-        if self.temp_loc_list:
-            try:
-                mc.delete(self.temp_loc_list)
-            except:
-                pass
-            self.temp_slider_locators = False
-
-        # Get space info from ui
-        self.set_space()
-
-        self.hooked_up_grp = mc.group(name="hooked_up_Aim_Loc_Grp", empty=1)
-        mc.setAttr(self.hooked_up_grp + ".visibility", 0)
-        mc.parent(self.hooked_up_grp, self.rooter_grp)
-
-        for obj in self.chain_ctrls:
-            # Make the 3 Locators
-            offsetLoc = mc.spaceLocator(n=obj + "aim_offset")
-            rootLoc = mc.spaceLocator(n=obj + "aim_root")
-            targetLoc = mc.spaceLocator(n=obj + "aim_target")
-
-            # Make sub group for organisation
-            # Parent locs to group (controlled by space input)
-            mc.parent(offsetLoc, rootLoc, self.hooked_up_grp)
-            mc.parent(targetLoc, self.rooter_grp)
-
-            # Sort target locators into list for later Offsetting
-            self.targetLocList.append(targetLoc[0])
-            self.offsetLocList.append(offsetLoc[0])
-            self.rootLocList.append(rootLoc[0])
-
-            # Build AimConstraint setup
-            mc.parent(offsetLoc, rootLoc)
-
-            tempRootCon = mc.parentConstraint(obj, rootLoc, mo=0)
-
-            # Align target locator, then offset it in selected axis
-            tempCon = mc.parentConstraint(obj, targetLoc, mo=0)
-
-            if obj in self.chain_ctrl_override:
-                ctrl_index = self.chain_ctrl_override.index(obj)
-                ctrl_axis = self.chain_ctrl_axis_override[ctrl_index]
-
-                offset_value = [x * self.slider_val for x in ctrl_axis]
-                mc.xform(targetLoc, relative=1, objectSpace=1, translation=offset_value)
-            else:
-                mc.xform(targetLoc, relative=1, objectSpace=1, translation=self.offset_value)
-            mc.delete(tempCon)
+        if not self.config:
+            return
 
-            tempCon2 = mc.parentConstraint(obj, targetLoc, mo=1)
+        # Only the distance or axes changed on an existing rig, move its tips instead of rebuilding
+        builder = self.chain_rig_builder()
+        if builder and builder.update(self.config):
+            self.refresh_rigs(builder.rig_id)
+            return
 
-            self.bakees.append(rootLoc[0])
-            self.bakees.append(targetLoc[0])
+        # Guide locators become the rig's targets, any previous rig on the chain is deleted by the build
+        self.preview_builder().build()
 
-            tempConstraints.append(tempCon[0])
-            tempConstraints.append(tempCon2[0])
-            tempConstraints.append(tempRootCon[0])
+        self.rig_cache[self.builder.rig_id] = self.builder
+        self.refresh_rigs(self.builder.rig_id)
 
-        # Baking
-        self.myBake(self.bakees, space_obj=obj)
+    def refresh_rigs(self, current=None):
+        if current is None:
+            current = self.rig_combo.currentData()
 
-        # Deleting, now baked, Root and Target locator's constraints
-        mc.delete(tempConstraints)
+        registry = AimRigRegistry()
+        registry.prune()
 
-        # Setting Aim Constraints
-        self.make_aim_constraints()
+        self.rig_combo.blockSignals(True)
+        self.rig_combo.clear()
+        self.rig_combo.addItem("No rig", None)
+        self.rig_combo.addItem("All rigs", self.ALL_RIGS)
+        for rig_id in registry.rig_ids():
+            chain = registry.rigs[rig_id]["config"]["chain_ctrls"]
+            self.rig_combo.addItem("{0} ({1} ctrls) [{2}]".format(chain[0], len(chain), rig_id), rig_id)
 
-        #Spheres
-        if self.spheres_cb.isChecked():
-            self.make_spheres()
+        index = self.rig_combo.findData(current)
+        self.rig_combo.setCurrentIndex(max(index, 0))
+        self.rig_combo.blockSignals(False)
 
-    def set_space(self):
-        # Check if world space, make constraint and bake if not
-        self.rooter_grp = mc.group(name="collection_Aim_Loc_Grp", empty=1)
+    def queue_chain(self):
+        if self.config:
+            self.queue.append(self.config)
+        self.queue_label.setText("Queued chains: {0}".format(len(self.queue)))
 
-        if self.space:
-            print ("self.space: {0}".format(self.space))
+    def clear_queue(self):
+        self.queue = []
+        self.queue_label.setText("Queued chains: 0")
 
-            tempCon = mc.parentConstraint(self.space, self.rooter_grp)
-            self.myBake(bakee=self.rooter_grp)
-            mc.delete(tempCon)
-        else:
-            pass
+    def build_queue(self):
+        if not self.queue:
+            return
 
+        if self.builder:
+            self.builder.delete_locators()
 
-    def make_aim_constraints(self):
-        # Setting the pointCon for rootLocs (to lock ctrls in place), and Aim constraints
+        try:
+            builders = build_chains(self.queue)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Can't build queue", str(e))
+            return
 
-        for i in range(len(self.chain_ctrls)):
-            mc.pointConstraint(self.chain_ctrls[i], self.rootLocList[i], mo=0)
+        for builder in builders:
+            self.rig_cache[builder.rig_id] = builder
 
-            if self.chain_ctrls[i] in self.chain_ctrl_override:
-                ctrl_index = self.chain_ctrl_override.index(self.chain_ctrls[i])
-                ctrl_axis = self.chain_ctrl_axis_override[ctrl_index]
+        self.clear_queue()
+        self.refresh_rigs(builders[-1].rig_id if builders else None)
 
-                self.offset_override_value = [x * self.slider_val for x in ctrl_axis]
+    def chain_rig_builder(self):
+        # Builder of the rig already on exactly this chain, if any
+        registry = AimRigRegistry()
+        rig_ids = registry.rigs_for_ctrls(self.config.chain_ctrls)
+        if len(rig_ids) != 1:
+            return None
 
-                mc.aimConstraint(self.targetLocList[i], self.offsetLocList[i], mo=1, weight=1,
-                                 aimVector=ctrl_axis,
-                                 upVector=self.up_vector, worldUpType="objectrotation",
-                                 worldUpObject=self.rootLocList[i], worldUpVector=self.world_up_vector)
+        return self.cached_builder(rig_ids.pop(), registry)
 
-            else:
-                mc.aimConstraint(self.targetLocList[i], self.offsetLocList[i], mo=1, weight=1, aimVector=self.axis_matrix,
-                                 upVector=self.up_vector, worldUpType="objectrotation",
-                                 worldUpObject=self.rootLocList[i], worldUpVector=self.world_up_vector)
+    def cached_builder(self, rig_id, registry):
+        if rig_id not in self.rig_cache or not self.rig_cache[rig_id].aim_rig:
+            self.rig_cache[rig_id] = registry.builder(rig_id)
 
-            self.axis_to_skip_if_locked(self.chain_ctrls[i], self.offsetLocList[i])
-            ctrl_con = mc.orientConstraint(self.offsetLocList[i], self.chain_ctrls[i], mo=0)[0]
+        return self.rig_cache[rig_id]
 
-            self.ctrl_constraints.append(ctrl_con)
+    def rig_builders(self):
+        # Builders of the rig picked in the combo, every rig only when "All rigs" is picked
+        registry = AimRigRegistry()
 
-        mc.select(clear=True)
+        rig_id = self.rig_combo.currentData()
+        if rig_id == self.ALL_RIGS:
+            rig_ids = registry.rig_ids()
+        else:
+            rig_ids = [rig_id] if rig_id in registry.rigs else []
 
+        return [self.cached_builder(rig_id, registry) for rig_id in rig_ids]
 
-    def make_spheres(self):
-        #create nurbs Spheres
-        self.sphere_grp = mc.group(name="sphere_grp", empty=1)
-        mc.parent(self.sphere_grp, self.rooter_grp)
-        mc.setAttr(self.sphere_grp + ".visibility", 0)
-        mc.reorder(self.sphere_grp, front=1)
-        for index, ctrl in enumerate(self.chain_ctrls):
-            sphere = mc.sphere(radius=self.slider_val, n=ctrl + "_sphere", ch=0)
-            mc.parent(sphere, self.sphere_grp)
-            mc.pointConstraint(ctrl, sphere, mo=0)
-            mc.geometryConstraint(sphere, self.targetLocList[index])
-        mc.select(clear=1)
+    def rebuild_selected(self):
+        # Rebake just the selected controls, in whichever rigs they are
+        ctrls = mc.ls(selection=1) or []
+        registry = AimRigRegistry()
+        for rig_id in registry.rigs_for_ctrls(ctrls):
+            self.cached_builder(rig_id, registry).rebuild_controls(ctrls)
 
     def delete_rig_stuff(self):
-        # Delete nodes made by script
-        try:
-            mc.delete(self.rooter_grp)
-        except:
-            pass
-        try:
-            mc.delete(self.temp_loc_list)
-        except:
-            pass
+        if self.builder:
+            self.builder.delete_locators()
 
-        self.aim_rig = False
+        for builder in self.rig_builders():
+            builder.delete()
 
-    def axis_to_skip_if_locked(self, ctrl, loc):
-        xyz_skip_list = []
-
-        for axis in ['.rotateX', '.rotateY', '.rotateZ']:
-            its_locked = mc.getAttr(ctrl + axis, lock=1)
-            if its_locked:
-                xyz_skip_list.append(axis[-1].lower())
-
-        mc.orientConstraint(loc, ctrl, skip=xyz_skip_list, mo=0)
-
-        if xyz_skip_list != []:
-            print("Skip List: ", xyz_skip_list)
+        self.refresh_rigs()
 
     def offset_locs(self):
-        # make starting i val equal to offset if 'include first' check box is ticked
-        if self.include_first == True:
-            i = self.offset_multi + (self.offset_multi * self.exponent)
-        else:
-            i = 0
-        for loc in self.targetLocList:
-            animCurves = mc.listConnections(loc, t="animCurve")
-            mc.keyframe(animCurves, edit=1, relative=1, timeChange=i)
-
-            i = i + self.offset_multi + (self.offset_multi * self.exponent)
+        for builder in self.rig_builders():
+            builder.config.offset = self.offset_multi
+            builder.config.exponent = self.exponent
+            builder.config.include_first = self.include_first
+            builder.config.offset_profile = self.offset_profile
+            builder.config.offset_table = self.offset_table
+            builder.config.offset_mode = "timewarp" if self.time_warp_cb.isChecked() else "keys"
+            builder.offset_locs()
 
     def undo_offset(self):
-        # make starting i val equal to offset if 'include first' check box is ticked
-        if self.include_first == True:
-            i = self.offset_multi + (self.offset_multi * self.exponent)
-        else:
-            i = 0
-        for loc in self.targetLocList:
-            animCurves = mc.listConnections(loc, t="animCurve")
-            mc.keyframe(animCurves, edit=1, relative=1, timeChange=-i)
-
-            i = i + self.offset_multi + (self.offset_multi * self.exponent)
-
+        for builder in self.rig_builders():
+            builder.undo_offset()
 
-    #Bakeing
     def bake_all(self):
+        for builder in self.rig_builders():
+            builder.config.bake_range = self.bake_range()
+            builder.config.evaluation_mode = self.eval_mode_combo.currentData()
+            builder.config.fast_undo = self.fast_undo_cb.isChecked()
+            builder.config.bake_layer = self.anim_layer_cb.isChecked()
+            for key, value in self.reduce_settings().items():
+                setattr(builder.config, key, value)
+            builder.bake_all(stay_constrained=self.stay_constrained_cb.isChecked())
+
+        self.refresh_rigs()
+
+    def restore_snapshot(self):
+        for builder in [self.builder] + list(self.rig_cache.values()):
+            if builder and builder.snapshot:
+                builder.restore_snapshot()
+
+    def solve_bake(self):
+        if not self.config:
+            return
 
-        sel = self.selection
-        animLayer_name = sel[0] + "_base"
-
-        minTime = mc.playbackOptions(q=1, minTime=1)
-        maxTime = mc.playbackOptions(q=1, maxTime=1)
-        time_range = minTime, maxTime
-
-        # Extract base animation to new layer
-        extract_lyr = mc.animLayer(animLayer_name, override=1, addSelectedObjects=1, extractAnimation="BaseAnimation")
-
-        mc.bakeResults(sel, time=time_range, bakeOnOverrideLayer=True, preserveOutsideKeys=True)
-        bake_container = mc.ls(sl=1, type="container")[0]
-
-        if mc.animLayer(sel, q=1, affectedLayers=1) and mc.animLayer('BakeResults', q=1, exists=1):
-            mc.rename('BakeResults', "AimTail_offset{0}_bk_lyr".format(int(self.offset_multi)))
-
-        # Copy anim back to Base layer and delete
-        mc.animLayer('BaseAnimation', e=1, copyAnimation=extract_lyr)
-        mc.delete(extract_lyr)
-
-        # Delete Asset Container (made from baking)
-        mc.select(bake_container)
-        mc.DeleteSelectedContainers()
+        if AimRigRegistry().rigs_for_ctrls(self.config.chain_ctrls):
+            QtWidgets.QMessageBox.warning(self, "Rig exists", "Delete the aim rig before solving")
+            return
 
-        if self.stay_constrained_cb.isChecked() == False:
-            self.delete_constraints()
-            self.delete_rig_stuff()
+        if self.builder:
+            self.builder.delete_locators()
 
-    def delete_constraints(self):
-        mc.delete(self.ctrl_constraints, constraints=True)
+        self.builder = AimChainBuilder(self.config)
+        self.builder.solve_bake()
 
 
 
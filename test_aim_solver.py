@@ -0,0 +1,231 @@
+import numpy as np
+import pytest
+
+import aim_solver
+
+
+@pytest.mark.parametrize("rotate_order", sorted(aim_solver.ROTATE_ORDERS))
+def test_euler_round_trip(rotate_order):
+    rng = np.random.RandomState(rotate_order)
+    angles = rng.uniform(-170.0, 170.0, (50, 3))
+    # Away from gimbal lock on the middle axis, so the angles come back as they went in
+    middle = aim_solver.ROTATE_ORDERS[rotate_order][1]
+    angles[:, middle] = rng.uniform(-80.0, 80.0, 50)
+
+    matrices = aim_solver.euler_to_matrix(angles, rotate_order)
+    result = aim_solver.matrix_to_euler(matrices, rotate_order, unwrap=False)
+
+    np.testing.assert_allclose(result, angles, atol=1e-9)
+
+
+@pytest.mark.parametrize("rotate_order", sorted(aim_solver.ROTATE_ORDERS))
+def test_matrix_round_trip(rotate_order):
+    rng = np.random.RandomState(10 + rotate_order)
+    matrices = aim_solver.euler_to_matrix(rng.uniform(-180.0, 180.0, (50, 3)), rotate_order)
+
+    angles = aim_solver.matrix_to_euler(matrices, rotate_order, unwrap=False)
+
+    np.testing.assert_allclose(aim_solver.euler_to_matrix(angles, rotate_order), matrices, atol=1e-9)
+
+
+def test_single_axis_rotation():
+    # rotateY -90, X ends up on +Z like in Maya
+    matrix = aim_solver.euler_to_matrix([0.0, -90.0, 0.0])
+
+    np.testing.assert_allclose(matrix, [[0, 0, 1], [0, 1, 0], [-1, 0, 0]], atol=1e-12)
+
+
+def test_unwrap_removes_flips():
+    angles = np.zeros((21, 3))
+    angles[:, 2] = np.linspace(170.0, 190.0, 21)
+
+    result = aim_solver.matrix_to_euler(aim_solver.euler_to_matrix(angles))
+
+    np.testing.assert_allclose(result, angles, atol=1e-9)
+
+
+def test_aim_rotations_hand_computed():
+    # Aim +X at a target straight ahead on +Z, up +Y to world +Y:
+    # X goes to +Z, Y stays, Z goes to X cross Y = -X
+    rotation = aim_solver.aim_rotations([1.0, 2.0, 3.0], [1.0, 2.0, 8.0], [0.0, 1.0, 0.0],
+                                        [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+
+    np.testing.assert_allclose(rotation, [[0, 0, 1], [0, 1, 0], [-1, 0, 0]], atol=1e-12)
+    np.testing.assert_allclose(aim_solver.matrix_to_euler(rotation), [0.0, -90.0, 0.0], atol=1e-9)
+
+
+def test_aim_rotations_other_axes():
+    # Aim -Z along world +X with local +X kept towards world +Y
+    rotation = aim_solver.aim_rotations([0.0, 0.0, 0.0], [4.0, 0.0, 0.0], [0.0, 1.0, 0.0],
+                                        [0.0, 0.0, -1.0], [1.0, 0.0, 0.0])
+
+    np.testing.assert_allclose(rotation, [[0, 1, 0], [0, 0, -1], [-1, 0, 0]], atol=1e-12)
+
+
+def test_aim_rotations_broadcast_frames():
+    positions = np.zeros((4, 3))
+    targets = np.array([[1, 0, 0], [0, 0, 1], [-1, 0, 0], [0, 0, -1]], dtype=float)
+
+    rotations = aim_solver.aim_rotations(positions, targets, [0.0, 1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+
+    assert rotations.shape == (4, 3, 3)
+    np.testing.assert_allclose(np.matmul([1.0, 0.0, 0.0], rotations), targets, atol=1e-12)
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("linear", [0.0, 3.0, 6.0, 9.0, 12.0]),
+    ("exponential", [0.0, 2.0, 5.0, 9.5, 16.25]),
+    ("table", [0.0, 0.5, 1.0, 2.5, 4.0]),
+    ("ease_in", [0.0, 0.75, 3.0, 6.75, 12.0]),
+    ("ease_out", [0.0, 5.25, 9.0, 11.25, 12.0]),
+    ("ease_in_out", [0.0, 1.875, 6.0, 10.125, 12.0]),
+])
+def test_offset_profile(mode, expected):
+    shifts = aim_solver.offset_profile(5, 2.0, mode, exponent=0.5, table=[0.0, 1.0, 4.0])
+
+    np.testing.assert_allclose(shifts, expected)
+
+
+@pytest.mark.parametrize("mode", aim_solver.OFFSET_PROFILES)
+def test_offset_profile_empty_chain(mode):
+    shifts = aim_solver.offset_profile(0, 2.0, mode, exponent=0.5, table=[0.0, 1.0])
+
+    assert shifts.shape == (0,)
+
+
+@pytest.mark.parametrize("mode", sorted(aim_solver.EASES))
+def test_offset_profile_single_control(mode):
+    np.testing.assert_allclose(aim_solver.offset_profile(1, 2.0, mode), [0.0])
+
+
+def test_offset_profile_include_first():
+    np.testing.assert_allclose(aim_solver.offset_profile(5, 1.0, "linear", include_first=True),
+                               [1.0, 2.0, 3.0, 4.0, 5.0])
+
+
+def test_offset_profile_unknown_mode():
+    with pytest.raises(ValueError):
+        aim_solver.offset_profile(3, 1.0, "bounce")
+
+
+def matrices_4x4(rotations, translations):
+    rotations = np.asarray(rotations, dtype=float)
+    matrices = np.zeros(rotations.shape[:-2] + (4, 4))
+    matrices[..., :3, :3] = rotations
+    matrices[..., 3, :3] = translations
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+def random_chain(frames, count, seed=0):
+    # World matrices of a chain of controls, rotated and moving over the frames
+    rng = np.random.RandomState(seed)
+    rotations = aim_solver.euler_to_matrix(rng.uniform(-60.0, 60.0, (frames, count, 3)))
+    return matrices_4x4(rotations, rng.uniform(-5.0, 5.0, (frames, count, 3)))
+
+
+def test_target_positions():
+    ctrl_matrices = matrices_4x4(aim_solver.euler_to_matrix([[[0.0, -90.0, 0.0]]]), [[[1.0, 2.0, 3.0]]])
+
+    targets = aim_solver.target_positions(ctrl_matrices, [[2.0, 0.0, 0.0]])
+
+    np.testing.assert_allclose(targets, [[[1.0, 2.0, 5.0]]], atol=1e-12)
+
+
+def test_target_positions_shifted():
+    ctrl_matrices = random_chain(12, 3)
+    offsets = [[2.5, 0.0, 0.0], [0.0, 2.5, 0.0], [0.0, 0.0, -2.5]]
+    shifts = [0.0, 1.5, 4.0]
+
+    unshifted = aim_solver.target_positions(ctrl_matrices, offsets)
+    shifted = aim_solver.target_positions(ctrl_matrices, offsets, shifts=shifts)
+
+    frames = np.arange(12, dtype=float)
+    for c, shift in enumerate(shifts):
+        for axis in range(3):
+            np.testing.assert_allclose(shifted[:, c, axis], np.interp(frames - shift, frames, unshifted[:, c, axis]))
+
+
+def test_target_positions_shifted_in_space():
+    ctrl_matrices = random_chain(12, 2, seed=1)
+    offsets = [[0.0, 0.0, 3.0], [0.0, 0.0, 3.0]]
+    shifts = [2.0, 5.0]
+
+    space_matrices = random_chain(12, 1, seed=2)[:, 0]
+    space_matrices[..., :3, :3] *= 2.0
+
+    unshifted = aim_solver.target_positions(ctrl_matrices, offsets)
+    shifted = aim_solver.target_positions(ctrl_matrices, offsets, space_matrices, shifts)
+
+    # The shift happens in the space's local coordinates, it moves with the space afterwards
+    local = aim_solver.transform_points(unshifted, np.linalg.inv(space_matrices)[:, None])
+    frames = np.arange(12, dtype=float)
+    expected = np.empty_like(local)
+    for c, shift in enumerate(shifts):
+        for axis in range(3):
+            expected[:, c, axis] = np.interp(frames - shift, frames, local[:, c, axis])
+    expected = aim_solver.transform_points(expected, space_matrices[:, None])
+
+    np.testing.assert_allclose(shifted, expected, atol=1e-9)
+
+
+def test_solve_chain_targets_on_aim_axis():
+    # Targets straight down each control's aim axis keep the chain as it is
+    ctrl_matrices = random_chain(8, 4, seed=3)
+    aim_vectors = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, -1.0], [1.0, 0.0, 0.0]]
+    up_vectors = [[0.0, 0.0, 1.0], [0.0, 0.0, 1.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+
+    targets = aim_solver.target_positions(ctrl_matrices, np.multiply(aim_vectors, 2.5))
+    solved = aim_solver.solve_chain(ctrl_matrices, targets, aim_vectors, up_vectors)
+
+    np.testing.assert_allclose(solved, ctrl_matrices, atol=1e-9)
+
+
+def test_solve_chain_carries_children():
+    # Child 2 units down the parent's X, the parent aims X at +Z and takes the child along
+    ctrl_matrices = matrices_4x4(np.eye(3)[None, None].repeat(2, axis=1), [[[0.0, 0.0, 0.0], [2.0, 0.0, 0.0]]])
+    targets = [[[0.0, 0.0, 5.0], [0.0, 0.0, 10.0]]]
+
+    solved = aim_solver.solve_chain(ctrl_matrices, targets, [[1.0, 0.0, 0.0]] * 2, [[0.0, 1.0, 0.0]] * 2)
+
+    aimed = [[0, 0, 1], [0, 1, 0], [-1, 0, 0]]
+    np.testing.assert_allclose(solved[0, 0, :3, :3], aimed, atol=1e-12)
+    np.testing.assert_allclose(solved[0, 1, :3, :3], aimed, atol=1e-12)
+    np.testing.assert_allclose(solved[0, 1, 3, :3], [0.0, 0.0, 2.0], atol=1e-12)
+
+
+def test_moved_parents():
+    # Each control's parentMatrix is the chain control above it, so it becomes that control's solved matrix
+    ctrl_matrices = random_chain(6, 3, seed=4)
+    parents = aim_solver.chain_parents(3)
+    parent_matrices = np.array(ctrl_matrices)
+    parent_matrices[:, 1:] = ctrl_matrices[:, :-1]
+    parent_matrices[:, 0] = np.eye(4)
+
+    targets = aim_solver.target_positions(ctrl_matrices, [[0.0, 3.0, 1.0]] * 3)
+    solved = aim_solver.solve_chain(ctrl_matrices, targets, [[1.0, 0.0, 0.0]] * 3, [[0.0, 0.0, 1.0]] * 3)
+    moved = aim_solver.moved_parents(parent_matrices, ctrl_matrices, solved, parents)
+
+    np.testing.assert_allclose(moved[:, 0], parent_matrices[:, 0])
+    np.testing.assert_allclose(moved[:, 1:], solved[:, :-1], atol=1e-9)
+
+
+def test_rotate_values_round_trip():
+    # Local rotation is rotateAxis * rotate * jointOrient, under a rotated parent
+    rng = np.random.RandomState(5)
+    rotate_orders = [0, 2, 5]
+    angles = rng.uniform(-80.0, 80.0, (10, 3, 3))
+    rotate_axis = rng.uniform(-45.0, 45.0, (3, 3))
+    joint_orient = rng.uniform(-45.0, 45.0, (3, 3))
+
+    parent_world = random_chain(10, 3, seed=6)
+    world = np.array(parent_world)
+    for c, rotate_order in enumerate(rotate_orders):
+        local = np.matmul(np.matmul(aim_solver.euler_to_matrix(rotate_axis[c]),
+                                    aim_solver.euler_to_matrix(angles[:, c], rotate_order)),
+                          aim_solver.euler_to_matrix(joint_orient[c]))
+        world[:, c, :3, :3] = np.matmul(local, parent_world[:, c, :3, :3])
+
+    values = aim_solver.rotate_values(world, parent_world, rotate_orders, rotate_axis, joint_orient)
+
+    np.testing.assert_allclose(values, angles, atol=1e-9)